@@ -0,0 +1,152 @@
+"""
+move generation for many positions at once with numpy
+
+a batch is an (N, 64) int8 array, one row per position and one column per
+square in bitboard order (a1 = 0 ... h8 = 63), holding the same codes as
+Chess.board: 0 when empty, bitboard.CODE[name] for player A's pieces and
+the negative of that for player B's. turns is an (N,) array of the side
+to move, 0 for player A
+
+the moves come back as an (N, 64, 64) bool array, [n, from, to] set for
+every move Chess would list for position n. a position with a king knocked
+out is over and gets no moves at all, like perft and the engines treat it,
+though Chess itself would still list the other side's. everything is
+computed for the whole batch in array operations, there's no python loop
+over positions
+
+numpy is only needed for this module, nothing else in the package uses it
+"""
+import numpy as np
+
+from bitboard import DIAGONAL, KING, KNIGHT, ORTHOGONAL, bits
+
+PAWN, KNIGHT_CODE, BISHOP, CASTLE, QUEEN, KING_CODE = range(1, 7)
+OFF = 64  # extra column past h8, stands in for "off the board" in the tables
+
+
+def _targets(table) -> np.ndarray:
+    # (64, 64) bool from a tuple of per-square masks
+    out = np.zeros((64, 64), dtype=bool)
+    for sq, mask in enumerate(table):
+        out[sq, list(bits(mask))] = True
+    return out
+
+
+def _rays(lines) -> np.ndarray:
+    # (directions, 64, 7) square indexes walking out from each square,
+    # nearest first, padded with OFF
+    out = np.full((2 * len(lines[0]), 64, 7), OFF, dtype=np.intp)
+    for sq in range(64):
+        for i, (lower, upper, line) in enumerate(lines[sq]):
+            below = sorted(bits(lower), reverse=True)  # nearest is the highest index
+            above = sorted(bits(upper))
+            out[2 * i, sq, :len(below)] = below
+            out[2 * i + 1, sq, :len(above)] = above
+    return out
+
+
+KNIGHT_TO = _targets(KNIGHT)
+KING_TO = _targets(KING)
+RAYS = np.concatenate([_rays(ORTHOGONAL), _rays(DIAGONAL)])  # 4 orthogonal, then 4 diagonal
+ORTHOGONAL_RAYS = np.arange(8) < 4
+
+
+def _pawn_tables():
+    # per side: single step, double step and the two knockout squares for a
+    # pawn on each square, OFF where there's none
+    push = np.full((2, 64), OFF, dtype=np.intp)
+    double = np.full((2, 64), OFF, dtype=np.intp)
+    knockout = np.full((2, 64, 2), OFF, dtype=np.intp)
+    for side, direction, first in ((0, 1, 1), (1, -1, 6)):
+        for sq in range(64):
+            f, r = sq % 8, sq // 8
+            if not 0 <= r + direction < 8: continue
+            push[side, sq] = sq + 8 * direction
+            if r == first: double[side, sq] = sq + 16 * direction
+            for i, df in enumerate((-1, 1)):
+                if 0 <= f + df < 8: knockout[side, sq, i] = sq + 8 * direction + df
+    return push, double, knockout
+
+
+PAWN_PUSH, PAWN_DOUBLE, PAWN_KNOCKOUT = _pawn_tables()
+
+
+def encode(game) -> np.ndarray:
+    """
+    :return: game's position as one (64,) int8 row of a batch
+    """
+    # Chess.board already is this layout, one signed byte per square
+    return np.frombuffer(game.board, dtype=np.int8).copy()
+
+
+def stack(games):
+    """
+    :return: (boards, turns) for a batch of Chess games
+    """
+    return np.stack([encode(g) for g in games]), np.array([g.turn for g in games], dtype=np.int8)
+
+
+def move_masks(boards, turns) -> np.ndarray:
+    """
+    :param boards: (N, 64) int8
+    :param turns: (N,) side to move per position
+    :return: (N, 64, 64) bool, [n, from, to] for every move in position n,
+    none where a king has been knocked out
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    turns = np.asarray(turns, dtype=np.intp)
+    n = len(boards)
+    rows = np.arange(n)[:, None]
+    sign = np.where(turns == 0, 1, -1).astype(np.int8)[:, None]
+    mine = boards * sign  # own pieces positive whoever is to move
+    # one more column for OFF, counted as an own piece so nothing lands there
+    own = np.concatenate([mine > 0, np.ones((n, 1), dtype=bool)], axis=1)
+    enemy = np.concatenate([mine < 0, np.zeros((n, 1), dtype=bool)], axis=1)
+    occupied = own | enemy
+    moves = np.zeros((n, 64, 65), dtype=bool)
+
+    # knights and kings straight from the tables
+    moves[:, :, :64] |= (mine == KNIGHT_CODE)[:, :, None] & KNIGHT_TO & ~own[:, None, :64]
+    moves[:, :, :64] |= (mine == KING_CODE)[:, :, None] & KING_TO & ~own[:, None, :64]
+
+    # sliders: along each ray a square is reachable while nothing stood on
+    # the squares before it, and it's a move unless it holds an own piece
+    along = occupied[:, RAYS]  # (N, 8, 64, 7)
+    clear = (np.cumsum(along, axis=-1) - along) == 0
+    slider = np.where(ORTHOGONAL_RAYS[None, :, None],
+                      ((mine == CASTLE) | (mine == QUEEN))[:, None, :],
+                      ((mine == BISHOP) | (mine == QUEEN))[:, None, :])  # (N, 8, 64)
+    reach = clear & ~own[:, RAYS] & slider[..., None]
+    p, d, sq, k = np.nonzero(reach)
+    moves[p, sq, RAYS[d, sq, k]] = True
+
+    # pawns step onto empty squares and knock out diagonally
+    pawns = mine == PAWN
+    push = PAWN_PUSH[turns]  # (N, 64)
+    single = pawns & ~occupied[rows, push]
+    double = PAWN_DOUBLE[turns]
+    two = single & ~occupied[rows, double]
+    knockout = PAWN_KNOCKOUT[turns]  # (N, 64, 2)
+    hits = pawns[:, :, None] & enemy[rows[:, :, None], knockout]
+    p, sq = np.nonzero(single)
+    moves[p, sq, push[p, sq]] = True
+    p, sq = np.nonzero(two)
+    moves[p, sq, double[p, sq]] = True
+    p, sq, i = np.nonzero(hits)
+    moves[p, sq, knockout[p, sq, i]] = True
+
+    # a position with a king knocked out is over
+    kings = np.count_nonzero(np.abs(boards) == KING_CODE, axis=1) == 2
+    moves[~kings] = False
+    return moves[:, :, :64]
+
+
+def move_lists(boards, turns) -> list:
+    """
+    :return: one (k, 2) array of (from, to) square indexes per position
+    """
+    masks = move_masks(boards, turns)
+    if not len(masks): return []
+    p, frm, to = np.nonzero(masks)
+    counts = np.count_nonzero(masks.reshape(len(masks), 64 * 64), axis=1)
+    return np.split(np.stack([frm, to], axis=1), np.cumsum(counts)[:-1])
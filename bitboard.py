@@ -0,0 +1,122 @@
+"""
+bitboard helpers for Chess
+
+every square on the board is a bit in a 64-bit int, a1 is bit 0, b1 is
+bit 1 ... h1 bit 7, a2 bit 8 and so on up to h8 at bit 63. a set of squares
+(all pawns of a player, all occupied squares etc) is then a single int and
+testing whether a square is in that set is one `&`
+"""
+row = 'abcdefgh'
+# every piece name Chess knows about, in a fixed order for tables and codes
+PIECES = ('pawn', 'knight', 'bishop', 'castle', 'queen', 'king')
+# one signed byte per square on Chess.board: 0 for empty, 1 + PIECES index
+# for player A's pieces and the negative of that for player B's
+CODE = {key: i + 1 for i, key in enumerate(PIECES)}
+DECODE = {0: None}
+for _key, _code in CODE.items():
+    DECODE[_code] = (0, _key)
+    DECODE[-_code] = (1, _key)
+
+# square index -> ('a', 1) style tuple used everywhere else in Chess
+SQUARES = tuple((r, c) for c in range(1, 9) for r in row)
+INDEX = {pc: i for i, pc in enumerate(SQUARES)}
+# tuple -> single bit mask; off-board tuples like ('a', 9) are simply not
+# keys here, so BIT.get(m, 0) reads as an empty square
+BIT = {pc: 1 << i for i, pc in enumerate(SQUARES)}
+FULL = (1 << 64) - 1
+
+
+def mask_of(pieces) -> int:
+    """
+    :param pieces: iterable of (file, rank) tuples
+    :return: one mask with a bit set for each of them
+    """
+    mask = 0
+    for pc in pieces:
+        mask |= BIT[pc]
+    return mask
+
+
+def bits(mask: int):
+    # yield the index of every set bit, lowest first
+    while mask:
+        lsb = mask & -mask
+        yield lsb.bit_length() - 1
+        mask ^= lsb
+
+
+def to_squares(mask: int) -> list:
+    return [SQUARES[i] for i in bits(mask)]
+
+
+def iter_squares(mask: int):
+    # to_squares without building the list
+    for i in bits(mask):
+        yield SQUARES[i]
+
+
+def _leaper(steps) -> tuple:
+    # for every square, the mask of squares reachable by one of the
+    # (file, rank) steps without falling off the board
+    table = []
+    for f, r in ((i % 8, i // 8) for i in range(64)):
+        mask = 0
+        for df, dr in steps:
+            if 0 <= f + df < 8 and 0 <= r + dr < 8:
+                mask |= 1 << (f + df + 8 * (r + dr))
+        table.append(mask)
+    return tuple(table)
+
+
+# attack tables built once at import, indexed by square
+KNIGHT = _leaper([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING = _leaper([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# squares a pawn knocks out on, per side: player A's pawns go up the board
+PAWN_ATTACKS = (_leaper([(-1, 1), (1, 1)]), _leaper([(-1, -1), (1, -1)]))
+
+
+def _ray(sq: int, df: int, dr: int) -> int:
+    # every square from sq (exclusive) to the edge in one direction
+    mask = 0
+    f, r = sq % 8 + df, sq // 8 + dr
+    while 0 <= f < 8 and 0 <= r < 8:
+        mask |= 1 << (f + 8 * r)
+        f, r = f + df, r + dr
+    return mask
+
+
+def _lines(directions) -> tuple:
+    # per square, one (lower, upper, line) triple for each line through it;
+    # upper is the half running towards higher square indexes
+    return tuple(
+        tuple((_ray(sq, -df, -dr), _ray(sq, df, dr), _ray(sq, -df, -dr) | _ray(sq, df, dr))
+              for df, dr in directions)
+        for sq in range(64))
+
+
+ORTHOGONAL = _lines([(1, 0), (0, 1)])  # rank, file
+DIAGONAL = _lines([(1, 1), (-1, 1)])  # diagonal, anti-diagonal
+
+
+def _slide(lines, occupied: int) -> int:
+    # obstruction difference: the nearest blocker below the piece gives the
+    # lowest reachable bit, the nearest blocker above gives the highest and
+    # the attack set on that line is everything in between
+    attacks = 0
+    for lower, upper, line in lines:
+        below = lower & occupied
+        above = upper & occupied
+        attacks |= line & (2 * (above & -above) + (-1 << (below | 1).bit_length() - 1))
+    return attacks
+
+
+def castle_attacks(sq: int, occupied: int) -> int:
+    return _slide(ORTHOGONAL[sq], occupied)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return _slide(DIAGONAL[sq], occupied)
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return _slide(ORTHOGONAL[sq] + DIAGONAL[sq], occupied)
@@ -0,0 +1,49 @@
+"""
+a bounded least-recently-used cache with hit/miss counters
+"""
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        """
+        :param maxsize: entries kept, the least recently used goes first
+        """
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -1,6 +1,14 @@
-from itertools import zip_longest, chain
+from array import array
 from operator import itemgetter
 
+import evaluation
+import zobrist
+from bitboard import (BIT, CODE, DECODE, INDEX, KING, KNIGHT, PAWN_ATTACKS, PIECES,
+                      bishop_attacks, bits, castle_attacks, iter_squares, mask_of,
+                      queen_attacks, to_squares)
+from cache import LRUCache
+from moves import PROMOTION, unpack
+
 
 class Chess:
     """
@@ -9,17 +17,58 @@ class Chess:
     """
     # we have two class variables:
     # row is immutable and available as is to all our Chess instance,
-    # score records each player's number of wins on all instances of Chess
+    # score records each player's number of wins on all console games
+    # (start()) of Chess in this process; tournament.py keeps its own tally
     row = 'abcdefgh'
     score = [0, 0]
 
-    def __init__(self, a: dict, b: dict):
+    def __init__(self, a: dict, b: dict, interactive: bool = True, turn: int = 0,
+                 engines: tuple = (None, None), move_cache: int = 0, weights: tuple = None,
+                 halfmove: int = 0, fullmove: int = 1):
         """
         :param a: represents all pieces for player A
         :param b: represents all pieces for player B
+        :param interactive: start a console game right away, pass False to
+        only set up the position and drive it with legal_moves/apply_move
+        :param turn: side to move, 0 for player A and 1 for player B
+        :param engines: computer player for A and for B, anything called
+        with the game that returns one of its legal_moves (see engine.py);
+        None leaves that side to the console
+        :param move_cache: keep up to this many move lists, keyed by
+        position key and square, so asking again for the same piece in the
+        same position is a lookup (see cache_stats); 0 turns it off
+        :param weights: evaluation.load() tables to score the position
+        with, weights.txt by default
+        :param halfmove: moves since the last pawn move or knockout
+        :param fullmove: move number, goes up after every player B move
         """
         self.a = a
         self.b = b
+        # bitboards mirror the two dicts: pieces[0] is player A, pieces[1]
+        # player B, each mapping piece name -> mask of its squares. occupied
+        # holds one combined mask per player, every move method tests
+        # against these instead of scanning lists of tuples
+        self.pieces = ({k: mask_of(v) for k, v in a.items()},
+                       {k: mask_of(v) for k, v in b.items()})
+        self.occupied = [mask_of(self.all_pieces(a)), mask_of(self.all_pieces(b))]
+        # mailbox: one signed byte per square index holding the piece code
+        # (see bitboard.CODE), negative for player B and 0 when empty. kept
+        # up to date by _put/_remove so no one has to flatten the dicts to
+        # find a piece, piece_at() reads it back as (side, piece name)
+        self.board = array('b', bytes(64))
+        for side, player in enumerate((a, b)):
+            for key, pcs in player.items():
+                for pc in pcs:
+                    self.board[INDEX[pc]] = CODE[key] if side == 0 else -CODE[key]
+        # square level move methods: (square index, side) -> mask of targets
+        self.targets = {
+            'king': self.king_targets,
+            'queen': self.queen_targets,
+            'bishop': self.bishop_targets,
+            'knight': self.knight_targets,
+            'pawn': self.pawn_targets,
+            'castle': self.castle_targets
+        }
         self.all_moves = {
             'king': self.move_king,
             'queen': self.move_queen,
@@ -28,14 +77,41 @@ class Chess:
             'pawn': self.move_pawn,
             'castle': self.move_castle
         }
-        self.start()
+        self.cache = None
+        if move_cache:
+            self.cache = LRUCache(move_cache)
+            self.all_moves = {k: self.cached(v) for k, v in self.all_moves.items()}
+        self.turn = turn
+        # zobrist key of the position, _put/_remove and apply_move keep it
+        # current so it's always there for caches and repetition checks
+        self.key = zobrist.compute(a, b, turn)
+        self.history = []  # undo stack for make_move/unmake_move
+        # the two FEN counters, make_move/unmake_move keep them going
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+        # material and piece-square value from player A's point of view,
+        # _put/_remove add and take away the piece's entry as they go
+        self.weights = weights or evaluation.TABLES
+        self.value = evaluation.compute(self.pieces, self.weights)
+        # attack maps: attacks[side][sq] is the mask of squares hit by side's
+        # piece on sq, own pieces included. _put/_remove only mark the square
+        # in _dirty; the first query after redoes the pieces on those squares
+        # and the sliders whose rays cross them, so make/unmake don't pay
+        # for maps no one asks about. the union per side is put together
+        # again then too
+        self.attacks = ([0] * 64, [0] * 64)
+        self._attacked = [None, None]
+        self._dirty = 0
+        for side in (0, 1):
+            for key, mask in self.pieces[side].items():
+                for sq in bits(mask):
+                    self.attacks[side][sq] = self.attack_mask(key, sq, side)
+        if interactive: self.start(engines)
 
     def __str__(self):
-        if 'king' not in self.a: self.score[1] += 1
-        elif 'king' not in self.b: self.score[0] += 1
         return "playerA %d : %d playerB" % (self.score[0], self.score[1])
 
-    def start(self):
+    def start(self, engines=(None, None)):
         """
         each player starts with equal num of pieces, when start() is called
         it checks if the rotated player observing current turn has a king-
@@ -48,73 +124,324 @@ class Chess:
         :return:
         """
         while True:
-            for player in (self.a, self.b):  # player is the one currently playing
-                opponent = self.b if player == self.a else self.a
-                turn = 'player A' if player == self.a else 'player B'
-                print(self.a)
-                print(self.b)
-                if 'king' not in player:
-                    turn = 'player B' if turn == 'player A' else 'player A'  # winner
-                    print("%s wins" % turn)
-                    return self
-                else:
-                    print(turn)
-                    print('--------')
-                    self.play(player, opponent)
-                    print()
-                continue
+            print(self.a)
+            print(self.b)
+            result = self.result()
+            if result == 'draw':
+                print("draw, %s has no moves left" % self.names[self.turn])
+                return self
+            elif result:
+                # counted once here, printing the game doesn't touch score
+                self.score[self.names.index(result)] += 1
+                print("%s wins" % result)
+                return self
+            print(self.names[self.turn])
+            print('--------')
+            engine = engines[self.turn]
+            if engine is None: self.play(*self.sides())
+            else:
+                move = engine(self)
+                print("%s %s -> %s" % move)
+                self.apply_move(move)
+            print()
 
     def play(self, player, opponent):
         # decide which piece to move; king, queen, pawn etc
         # if any of its member is movable
+        options = self.generate(player, opponent)
         movable_types = []
-        for key in player:
-            for pc in player[key]:  # pc: piece
-                move = self.all_moves[key]
-                # every member type that is movable in the list
-                if move(pc, player, opponent) and key not in movable_types:
-                    movable_types.append(key)
-        for piece in range(len(movable_types)):
-            print(piece, movable_types[piece])  # present movable member type
-        choice_type = input("Enter the preceding num to your choice piece: ")
-        if self.validate_input(choice_type) and int(choice_type) < len(movable_types):
-            choice_type = movable_types[int(choice_type)]  # king, queen, or pawn etc
-        else: raise Exception("%s is not part of the options" % choice_type)   # IndexError or ValueError
-        func = self.all_moves[choice_type]
+        for key, pc, mv in options:
+            # every member type that is movable in the list
+            if key not in movable_types: movable_types.append(key)
+        choice_type = self.choose(movable_types, "Enter the preceding num to your choice piece: ")
         # actual movable pc in choice_type or key
-        specifics = [pc for pc in player[choice_type] if func(pc, player, opponent)]
-        for pc in range(len(specifics)):
-            print(pc, specifics[pc])
-        choice_pc = input("Enter the preceding num to your choice %s: " % choice_type)
-        if self.validate_input(choice_pc) and int(choice_pc) < len(specifics):
-            choice_pc = specifics[int(choice_pc)]  # pawn at a2, c2, or d2 etc
-        else: raise Exception("%s is not part of the options" % choice_pc)
+        specifics = []
+        for key, pc, mv in options:
+            if key == choice_type and pc not in specifics: specifics.append(pc)
+        choice_pc = self.choose(specifics, "Enter the preceding num to your choice %s: " % choice_type)
         # present moves, make move
-        moves = self.all_moves[choice_type](choice_pc, player, opponent)
-        for move in range(len(moves)):
-            print(move, moves[move])
-        choice_mv = input("Enter the preceding num to your choice move: ")
-        if self.validate_input(choice_mv) and int(choice_mv) < len(moves):
-            choice_mv = moves[int(choice_mv)]
-        else: raise Exception("%s is not part of the options" % choice_mv)
+        moves = [mv for key, pc, mv in options if key == choice_type and pc == choice_pc]
+        choice_mv = self.choose(moves, "Enter the preceding num to your choice move: ")
+        self.apply_move((choice_type, choice_pc, choice_mv))
+        return
+
+    def choose(self, options, prompt):
+        for i in range(len(options)):
+            print(i, options[i])
+        choice = input(prompt)
+        if self.validate_input(choice) and int(choice) < len(options):
+            return options[int(choice)]
+        raise Exception("%s is not part of the options" % choice)  # IndexError or ValueError
+
+    # headless core: everything below works without a console, the game
+    # above is just one way of picking moves for it
+
+    names = ('player A', 'player B')
+
+    def sides(self):
+        # (player, opponent) dicts for the side to move
+        return (self.a, self.b) if self.turn == 0 else (self.b, self.a)
+
+    def generate(self, player, opponent):
+        """
+        :return: every move player can make, as (piece name, from, to)
+        """
+        moves = []
+        for key in player:
+            move = self.all_moves[key]
+            for pc in player[key]:  # pc: piece
+                for mv in move(pc, player, opponent):
+                    moves.append((key, pc, mv))
+        return moves
+
+    def iter_moves(self, player, opponent):
+        """
+        generate() one move at a time, so a caller that stops early never
+        pays for the rest
+        """
+        side = self.side(player)
+        for key in list(player):
+            targets = self.targets[key]
+            for pc in list(player.get(key, ())):
+                yield from ((key, pc, mv) for mv in iter_squares(targets(INDEX[pc], side)))
+
+    def iter_piece(self, key, choice_pc, player):
+        # lazy move_<key>: the squares choice_pc can go to, one by one
+        return iter_squares(self.targets[key](INDEX[choice_pc], self.side(player)))
+
+    def has_any_move(self, side=None):
+        """
+        :param side: 0 or 1, the side to move by default
+        :return: True as soon as one piece has somewhere to go
+        """
+        side = self.turn if side is None else side
+        for key, mask in self.pieces[side].items():
+            targets = self.targets[key]
+            for sq in bits(mask):
+                if targets(sq, side): return True
+        return False
+
+    def legal_moves(self):
+        return self.generate(*self.sides())
+
+    def packed_moves(self):
+        """
+        legal_moves for the side to move as 16-bit ints (see moves.py),
+        straight from the bitboards without building any tuples
+        """
+        side = self.turn
+        moves = []
+        for key, mask in self.pieces[side].items():
+            targets = self.targets[key]
+            code = CODE[key] << 12
+            for sq in bits(mask):
+                base = sq | code
+                if key == 'pawn' and sq // 8 == (6 if side == 0 else 1): base |= PROMOTION
+                for to in bits(targets(sq, side)):
+                    moves.append(base | to << 6)
+        return moves
+
+    def make_move(self, move):
+        """
+        play move for the side to move and hand the turn over, remembering on
+        self.history whatever unmake_move needs to take it back
+        :param move: (piece name, from, to) as listed by legal_moves, or
+        one of packed_moves
+        :return: (side, piece name) knocked out, or None
+        """
+        if isinstance(move, int): move = unpack(move)
+        choice_type, choice_pc, choice_mv = move
+        player, opponent = self.sides()
+        pos = player[choice_type].index(choice_pc)
+        # note what stands on the target square before we land on it, and
+        # where it sat in opponent's lists
+        captured = self.piece_at(choice_mv)
+        if captured and captured[0] == self.side(opponent):
+            knocked_out = (captured[1],) + self._slot(opponent, captured[1], choice_mv)
+        else: captured = knocked_out = None
         # when move is made, that piece changes column, if the piece knocks out
         # opponent's, the piece is withdrawn or becomes None
         self.replace_piece(player, choice_type, choice_pc, choice_mv)  # pc becomes move
+        promoted = None
         if choice_type == "pawn" and (choice_mv[1] == 1 or choice_mv[1] == 8):
             # choice_mv replaced choice_pc at this stage,
-            # so pop it and send it as arg
-            choice_mv = player['pawn'].index(choice_mv)
-            choice_mv = player['pawn'].pop(choice_mv)
-            self.replace_pawn(player, choice_mv)
+            # so take it out and send it as arg
+            pawn = self._slot(player, 'pawn', choice_mv)
+            self.take_out_piece(player, 'pawn', choice_mv)
+            promoted = (self.replace_pawn(player, choice_mv),) + pawn
         # chance to knockout piece
-        # if choice_mv was popped, its still choice_mv- important!
-        if choice_mv in [m for m in moves if m in self.all_pieces(opponent)]:
-            for k, v in opponent.items():
-                if choice_mv in v:
-                    choice_type = k  # corresponding key for opponent's piece
-                    break
-            self.take_out_piece(opponent, choice_type, choice_mv)
-        return
+        if knocked_out: self.take_out_piece(opponent, captured[1], choice_mv)
+        self.history.append((move, pos, promoted, knocked_out, self.halfmove))
+        self.halfmove = 0 if choice_type == 'pawn' or knocked_out else self.halfmove + 1
+        self.fullmove += self.turn
+        self.turn ^= 1
+        self.key ^= zobrist.TURN
+        return captured
+
+    # the headless API from before make/unmake
+    apply_move = make_move
+
+    def unmake_move(self):
+        """
+        take back the last make_move, dicts, boards and key end up exactly
+        as they were before it
+        :return: the move taken back
+        """
+        move, pos, promoted, knocked_out, self.halfmove = self.history.pop()
+        choice_type, choice_pc, choice_mv = move
+        self.turn ^= 1
+        self.key ^= zobrist.TURN
+        self.fullmove -= self.turn
+        player, opponent = self.sides()
+        if promoted:
+            self.take_out_piece(player, promoted[0], choice_mv)
+            self._restore(player, 'pawn', choice_mv, *promoted[1:])
+        # the list keeps its order, the piece goes back to the index it left
+        player[choice_type][pos] = choice_pc
+        # put down before taking up, a lone piece's key never leaves pieces
+        # and keeps its place there
+        self._put(player, choice_type, choice_pc)
+        self._remove(player, choice_type, choice_mv)
+        if knocked_out: self._restore(opponent, knocked_out[0], choice_mv, *knocked_out[1:])
+        return move
+
+    @staticmethod
+    def _slot(player, key, pc):
+        # (index of pc in its list, position of key among player's keys if
+        # taking pc out is going to drop the key too)
+        if len(player[key]) > 1: return player[key].index(pc), None
+        return 0, list(player).index(key)
+
+    def _restore(self, player, key, pc, index, order):
+        # undo take_out_piece, bringing a dropped key back to its old place
+        if order is None: player[key].insert(index, pc)
+        else:
+            tail = [(k, player.pop(k)) for k in list(player)[order:]]
+            player[key] = [pc]
+            player.update(tail)
+        self._put(player, key, pc)
+        if order is not None:
+            # _put added the key last, the masks follow player's order too
+            masks = self.pieces[self.side(player)]
+            for k, v in tail:
+                masks[k] = masks.pop(k)
+
+    def result(self):
+        """
+        :return: None while the game is on, the winner's name once a king
+        has been knocked out, or 'draw' when the side to move is stuck
+        """
+        if 'king' not in self.a: return self.names[1]
+        if 'king' not in self.b: return self.names[0]
+        if not self.has_any_move(): return 'draw'
+        return None
+
+    def cached(self, move):
+        # move method going through self.cache first
+        def lookup(choice_pc, player, opponent):
+            entry = (self.key, INDEX[choice_pc])
+            moves = self.cache.get(entry)
+            if moves is None:
+                moves = tuple(move(choice_pc, player, opponent))
+                self.cache.put(entry, moves)
+            return list(moves)
+        return lookup
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else None
+
+    def side(self, player):
+        # 0 for player A, 1 for player B; indexes pieces and occupied
+        return 0 if player is self.a else 1
+
+    def piece_at(self, pc):
+        # (side, piece name) standing on pc, None when it's empty
+        return DECODE[self.board[INDEX[pc]]]
+
+    def attack_mask(self, key, sq, side):
+        # squares the piece could knock out on from sq, whoever stands there
+        if key == 'pawn': return PAWN_ATTACKS[side][sq]
+        elif key == 'knight': return KNIGHT[sq]
+        elif key == 'king': return KING[sq]
+        occupied = self.occupied[0] | self.occupied[1]
+        if key == 'castle': return castle_attacks(sq, occupied)
+        elif key == 'bishop': return bishop_attacks(sq, occupied)
+        return queen_attacks(sq, occupied)
+
+    def _sync(self):
+        # bring attacks up to date with every square changed since the last
+        # query
+        dirty, self._dirty = self._dirty, 0
+        for sq in bits(dirty):
+            code = self.board[sq]
+            self.attacks[0][sq] = self.attacks[1][sq] = 0
+            if code:
+                side = 0 if code > 0 else 1
+                self.attacks[side][sq] = self.attack_mask(PIECES[abs(code) - 1], sq, side)
+        for sq in bits(dirty):
+            self._rays_through(sq)
+        self._attacked = [None, None]
+
+    def _rays_through(self, sq):
+        # a square filled or emptied lengthens or cuts short every slider
+        # ray that reaches it, from either side. with several squares changed
+        # the one nearest a slider along its line is in reach of it
+        occupied = self.occupied[0] | self.occupied[1]
+        straight = castle_attacks(sq, occupied)
+        diagonal = bishop_attacks(sq, occupied)
+        for side in (0, 1):
+            pieces = self.pieces[side]
+            queens = pieces.get('queen', 0)
+            sliders = straight & (pieces.get('castle', 0) | queens) | diagonal & (pieces.get('bishop', 0) | queens)
+            for s in bits(sliders):
+                self.attacks[side][s] = self.attack_mask(PIECES[abs(self.board[s]) - 1], s, side)
+
+    def attacked(self, side):
+        # mask of every square side hits
+        if self._dirty: self._sync()
+        if self._attacked[side] is None:
+            mask = 0
+            for sq in bits(self.occupied[side]):
+                mask |= self.attacks[side][sq]
+            self._attacked[side] = mask
+        return self._attacked[side]
+
+    def is_attacked(self, sq, side):
+        """
+        :param sq: square index or ('a', 1) style tuple
+        :param side: 0 or 1, whose pieces might hit it
+        """
+        if not isinstance(sq, int): sq = INDEX[sq]
+        return bool(self.attacked(side) >> sq & 1)
+
+    def in_check(self, side):
+        # side's king could be knocked out next move
+        king = self.pieces[side].get('king', 0)
+        return bool(king and self.attacked(1 - side) & king)
+
+    def _put(self, player, key, pc):
+        side = self.side(player)
+        bit = BIT[pc]
+        self.pieces[side][key] = self.pieces[side].get(key, 0) | bit
+        self.occupied[side] |= bit
+        self.board[INDEX[pc]] = CODE[key] if side == 0 else -CODE[key]
+        self.key ^= zobrist.KEYS[side][key][INDEX[pc]]
+        self.value += self.weights[side][key][INDEX[pc]]
+        self._dirty |= bit
+
+    def _remove(self, player, key, pc):
+        side = self.side(player)
+        bit = BIT[pc]
+        self.pieces[side][key] &= ~bit
+        if not self.pieces[side][key]: self.pieces[side].pop(key)
+        self.occupied[side] &= ~bit
+        self.key ^= zobrist.KEYS[side][key][INDEX[pc]]
+        self.value -= self.weights[side][key][INDEX[pc]]
+        # a capture puts the mover on pc before the victim is taken out,
+        # only clear the square if it still holds what we're removing
+        code = CODE[key] if side == 0 else -CODE[key]
+        if self.board[INDEX[pc]] == code: self.board[INDEX[pc]] = 0
+        self._dirty |= bit
 
     # @staticmethod
     # def replace_pawn(player, pc):
@@ -133,22 +460,21 @@ class Chess:
     #     else: player['queen'] = [pc]
     #     return
 
-    @staticmethod
-    def replace_pawn(player, pc):
+    def replace_pawn(self, player, pc):
         # if queen, reinstate other piece following priority_list else,
         # cede priority to queen piece, once you reclaim all super pieces- enjoy!
+        # a type already at two (or more) members is skipped rather than
+        # overwritten, and with nothing left to reclaim it's another queen
         priority_list = ['queen', 'bishop', 'knight', 'castle']
+        key = 'queen'
         if 'queen' in player:
-            for key in priority_list[1:]:
-                # has one type left
-                if key in player and len(player[key]) < 2:
-                    player[key].append(pc)
-                    return
-                else:
-                    player[key] = [pc]
-                    return
-        elif 'queen' not in player: player['queen'] = [pc]
-        return
+            for k in priority_list[1:]:
+                if len(player.get(k, ())) < 2:
+                    key = k
+                    break
+        player.setdefault(key, []).append(pc)
+        self._put(player, key, pc)
+        return key
 
     @staticmethod
     def validate_input(string):
@@ -157,18 +483,19 @@ class Chess:
             else: return bool((int(string)))
         except ValueError as e: return
 
-    @staticmethod
-    def take_out_piece(opponent, key, move):
+    def take_out_piece(self, opponent, key, move):
         pos = opponent[key].index(move)
         opponent[key].pop(pos)
         if not opponent[key]: opponent.pop(key)
+        self._remove(opponent, key, move)
 
-    @staticmethod
-    def replace_piece(player: dict, key: str, pc: tuple, move: tuple):
+    def replace_piece(self, player: dict, key: str, pc: tuple, move: tuple):
         # index pc, insert at index, pop at index+1
         pos = player[key].index(pc)
         player[key].insert(pos, move)
         player[key].pop(pos+1)
+        self._put(player, key, move)
+        self._remove(player, key, pc)
         return
 
     @staticmethod
@@ -191,227 +518,61 @@ class Chess:
     #     else: return
 
     def move_pawn(self, choice_pc, player, opponent):
-        row = self.row
-        num = choice_pc[1]
-        ri = row.index(choice_pc[0])  # ri: row index
-        ro1 = row[ri-1:ri+2:2]
-        ro2 = row[ri+1:ri+2]
-        direction = 1 if player == self.a else -1
-        col = range(num+direction, num+(direction*2))
-        not_moved = bool(num == 2 or num == 7)
-        pl_pcs = self.all_pieces(player)
-        opponent_pcs = self.all_pieces(opponent)
-        moves = []
-        if not_moved:
-            for m in zip([choice_pc[0]]*2, [num+direction, num+(direction*2)]):
-                if m not in pl_pcs and m not in opponent_pcs:
-                    moves.append(m)
-                else: break
-            if ri > 0:  # when pc[0] is  `a`
-                m1 = [m for m in zip_longest(ro1, col, fillvalue=num+direction)
-                      if m in opponent_pcs]
-            else:
-                m1 = [m for m in zip_longest(ro2, col, fillvalue=num+direction)
-                      if m in opponent_pcs]
-        else:
-            for m in zip(choice_pc[0], [num+direction]):
-                if m not in pl_pcs+opponent_pcs:
-                    moves.append(m)
-                else: break
-            if ri > 0:
-                m1 = [m for m in zip_longest(ro1, col, fillvalue=num+direction)
-                      if m in opponent_pcs]
-            else:
-                m1 = [m for m in zip_longest(ro2, col, fillvalue=num+direction)
-                      if m in opponent_pcs]
-        if m1: moves.extend(m1)
-        moves[:] = [m for m in moves if 1 <= m[1] <= 8]
-        return moves
+        return to_squares(self.pawn_targets(INDEX[choice_pc], self.side(player)))
 
     def move_castle(self, choice_pc, player, opponent):
-        row = self.row
-        moves = []
-        mid = row.index(choice_pc[0])
-        ro1 = row[:mid][::-1]
-        ro2 = row[mid+1:]
-        h_co = range(choice_pc[1], choice_pc[1]-1, -1)   # horizontal column
-        v_co1 = range(choice_pc[1]-1, 1, -1)
-        v_co2 = range(choice_pc[1]+1, 9)
-        pl_pcs = self.all_pieces(player)
-        opponent_pcs = self.all_pieces(opponent)
-        # horizontally
-        for m in zip(ro1, list(h_co)*len(ro1)):
-            if m not in pl_pcs and m in opponent_pcs:
-                moves.append(m)
-                break
-            elif m not in pl_pcs and m not in opponent_pcs:
-                moves.append(m)
-                continue
-            else: break
-        for m in zip(ro2, list(h_co)*len(ro2)):
-            if m not in pl_pcs and m in opponent_pcs:
-                moves.append(m)
-                break
-            elif m not in pl_pcs and m not in opponent_pcs:
-                moves.append(m)
-                continue
-            else: break
-        # vertically
-        for m in zip(choice_pc[0]*(choice_pc[1]-1), v_co1):
-            if m not in pl_pcs and m in opponent_pcs:
-                moves.append(m)
-                break
-            elif m not in pl_pcs and m not in opponent_pcs:
-                moves.append(m)
-                continue
-            else: break
-        for m in zip(choice_pc[0]*(choice_pc[1]-1), v_co2):
-            if m not in pl_pcs and m in opponent_pcs:
-                moves.append(m)
-                break
-            elif m not in pl_pcs and m not in opponent_pcs:
-                moves.append(m)
-                continue
-            else: break
-        moves[:] = [m for m in moves if 1 <= m[1] <= 8]
-        return moves
+        return to_squares(self.castle_targets(INDEX[choice_pc], self.side(player)))
 
     def move_knight(self, choice_pc, player, opponent):
-        row = self.row
-        mid = row.index(choice_pc[0])
-        col = choice_pc[1]
-        pl_pcs = self.all_pieces(player)
-        if 1 < mid < 6:
-            ro1 = row[mid-2:mid+3]
-            ro1 = (lambda s: ''.join(s.split(ro1[2])))(ro1)  # mid chr since there are no moves on that line
-            mv1 = ((r, c) for r in ro1[::3] for c in range(col-1, col+2, 2)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            mv2 = ((r, c) for r in ro1[1:-1] for c in range(col-2, col+4, 4)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            moves = [m for m in chain(mv1, mv2)]
-            return moves
-        elif mid == 1:
-            ro1 = row[mid-1:mid+3]
-            ro1 = (lambda s: ''.join(s.split(ro1[1])))(ro1)
-            mv1 = ((r, c) for r in ro1[:-1] for c in range(col-2, col+4, 4)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            mv2 = ((r, c) for r in ro1[-1] for c in range(col-1, col+2, 2)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            moves = [m for m in chain(mv1, mv2)]
-            return moves
-        elif mid == 6:
-            ro1 = row[mid-2:]
-            ro1 = (lambda s: ''.join(s.split(ro1[2])))(ro1)
-            mv1 = ((r, c) for r in ro1[1:] for c in range(col-2, col+4, 4)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            mv2 = ((r, c) for r in ro1[0] for c in range(col-1, col+2, 2)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            moves = [m for m in chain(mv1, mv2)]
-            return moves
-        elif mid == 0:
-            ro1 = row[1:3]
-            mv1 = ((r, c) for r in ro1[0] for c in range(col-2, col+4, 4)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            mv2 = ((r, c) for r in ro1[1] for c in range(col-1, col+2, 2)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            moves = [m for m in chain(mv1, mv2)]
-            return moves
-        elif mid == 7:
-            ro1 = row[-3:]
-            ro1 = (lambda s: ''.join(s.split(ro1[2])))(ro1)
-            mv1 = ((r, c) for r in ro1[0] for c in range(col-1, col+2, 2)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            mv2 = ((r, c) for r in ro1[1] for c in range(col-2, col+4, 4)
-                   if (r, c) not in pl_pcs if 1 <= c <= 8)
-            moves = [m for m in chain(mv1, mv2)]
-            return moves
+        return to_squares(self.knight_targets(INDEX[choice_pc], self.side(player)))
 
     def move_bishop(self, choice_pc, player, opponent):
-        opponent_pcs = self.all_pieces(opponent)
-        pl_pcs = self.all_pieces(player)
-        row = self.row
-        moves = []
-        ri = row.index(choice_pc[0])  # row index
-        mid = choice_pc[1]
-        ro1 = row[ri-1::-1]  # first half
-        ro2 = row[ri+1:]
-        distance1 = len(ro1)  # from row[0] to pc[0]
-        distance2 = len(ro2)
-        co1 = range(mid+1, mid+distance1+1)  # 1st half column
-        co2 = range(mid-1, 0, -1)
-        co3 = range(mid+1, 1+mid+distance2)
-        # first half
-        zip1 = zip(ro1, co1)
-        zip2 = zip(ro1, co2)
-        if zip1:
-            for m in zip1:
-                if m not in pl_pcs and (m in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    break
-                elif m not in pl_pcs and (m not in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    continue
-                else: break  # accumulate possible empty columns, break when occupied
-        if zip2:
-            for m in zip2:
-                if m not in pl_pcs and (m in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    break
-                elif m not in pl_pcs and (m not in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    continue
-                else: break
-        # 2nd, diagon alley  :)
-        zip1 = zip(ro2, co3)
-        zip2 = zip(ro2, co2)
-        if zip1:
-            for m in zip1:
-                if m not in pl_pcs and (m in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    break
-                elif m not in pl_pcs and (m not in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    continue
-                else: break
-        if zip2:
-            for m in zip2:
-                if m not in pl_pcs and (m in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    break
-                elif m not in pl_pcs and (m not in opponent_pcs and 1 <= m[1] <= 8):
-                    moves.append(m)
-                    continue
-                else: break
-        return moves
+        return to_squares(self.bishop_targets(INDEX[choice_pc], self.side(player)))
 
     def move_queen(self, choice_pc, player, opponent):
-        return self.move_bishop(choice_pc, player, opponent) + \
-               self.move_castle(choice_pc, player, opponent)
+        return to_squares(self.queen_targets(INDEX[choice_pc], self.side(player)))
 
     def move_king(self, choice_pc, player, opponent):
-        pl_pcs = self.all_pieces(player)
-        row = self.row
-        ri = row.index(choice_pc[0])
-        ro1 = row[ri-1:ri+2]
-        ro2 = row[ri:ri+2]
-        ro3 = row[ri:ri-2:-1]
-        col = range(choice_pc[1]-1, choice_pc[1]+2)
-        if 0 < ri < 7:
-            zip1 = zip([ro1[0]]*len(col), col)
-            zip2 = zip([ro1[1]]*len(col), col)
-            zip3 = zip([ro1[2]]*len(col), col)
-            moves = [m for m in chain(zip1, zip2, zip3) if m != choice_pc
-                     if m not in pl_pcs if 1 <= m[1] <= 8]
-            return moves
-        elif ri == 7:
-            zip1 = zip([ro3[0]]*len(col), col)
-            zip2 = zip([ro3[1]]*len(col), col)
-            moves = [m for m in chain(zip1, zip2) if m != choice_pc
-                     if m not in pl_pcs if 1 <= m[1] <= 8]
-            return moves
-        else:
-            zip1 = zip([ro2[0]]*len(col), col)
-            zip2 = zip([ro2[1]]*len(col), col)
-            moves = [m for m in chain(zip1, zip2) if m != choice_pc
-                     if m not in pl_pcs if 1 <= m[1] <= 8]
-            return moves
+        return to_squares(self.king_targets(INDEX[choice_pc], self.side(player)))
+
+    # the same moves by square index (0 for a1 ... 63 for h8) and side,
+    # as a mask of target squares
+
+    def pawn_targets(self, sq, side):
+        board = self.board
+        direction = 8 if side == 0 else -8
+        ahead = sq + direction
+        if not 0 <= ahead < 64: return 0
+        targets = 0
+        if not board[ahead]:
+            targets = 1 << ahead
+            # first move of the game for this pawn, may take two steps
+            if sq // 8 == (1 if side == 0 else 6) and not board[ahead + direction]:
+                targets |= 1 << ahead + direction
+        # diagonal knockouts, opponent's codes have the other sign
+        sign = 1 if side == 0 else -1
+        if sq % 8 > 0 and board[ahead - 1] * sign < 0: targets |= 1 << ahead - 1
+        if sq % 8 < 7 and board[ahead + 1] * sign < 0: targets |= 1 << ahead + 1
+        return targets
+
+    def knight_targets(self, sq, side):
+        # table lookup, then drop squares held by own pieces
+        return KNIGHT[sq] & ~self.occupied[side]
+
+    def king_targets(self, sq, side):
+        return KING[sq] & ~self.occupied[side]
+
+    def castle_targets(self, sq, side):
+        return self.slide(castle_attacks, sq, side)
+
+    def bishop_targets(self, sq, side):
+        return self.slide(bishop_attacks, sq, side)
+
+    def queen_targets(self, sq, side):
+        return self.slide(queen_attacks, sq, side)
+
+    def slide(self, attacks, sq, side):
+        # attacks() stops each ray at the first occupied square in either
+        # colour; that square is a capture unless it's one of our own
+        own = self.occupied[side]
+        return attacks(sq, own | self.occupied[1 - side]) & ~own
@@ -0,0 +1,116 @@
+"""
+how many moves a piece needs from one square to another
+
+run.py's move_bishop answers that for a bishop along one diagonal. here it's
+every piece, every pair of squares, worked out once by breadth-first search
+over the bitboard move tables and kept as a 64x64 table, so a query is an
+index into it. 0 means start == end, -1 that end can't be reached (a bishop
+changing colour, a pawn going backwards, a square walled off by blockers)
+
+    distance('knight', ('b', 1), ('c', 8))            -> 4
+    distances('bishop', starts, ends)                 -> one answer per pair
+    distance('castle', ('a', 1), ('a', 8), blockers=mask_of([('a', 4)]))
+
+blockers are squares no piece may enter or pass; tables for a given blocker
+mask are searched on first use and cached
+"""
+from array import array
+from functools import lru_cache
+
+from bitboard import INDEX, KING, KNIGHT, PIECES, bishop_attacks, bits, castle_attacks, queen_attacks
+
+try:
+    import numpy as np
+except ImportError:  # distances() falls back on a plain loop
+    np = None
+
+
+def _pawn(side):
+    # a pawn on an otherwise empty path: one step, two from its first row
+    direction = 8 if side == 0 else -8
+    first = 1 if side == 0 else 6
+
+    def step(sq, blockers):
+        ahead = sq + direction
+        if not 0 <= ahead < 64 or blockers >> ahead & 1: return 0
+        targets = 1 << ahead
+        if sq // 8 == first and not blockers >> ahead + direction & 1:
+            targets |= 1 << ahead + direction
+        return targets
+    return step
+
+
+STEPS = {
+    'knight': lambda sq, blockers: KNIGHT[sq],
+    'king': lambda sq, blockers: KING[sq],
+    'bishop': bishop_attacks,
+    'castle': castle_attacks,
+    'queen': queen_attacks,
+}
+PAWN_STEPS = (_pawn(0), _pawn(1))
+
+
+def _search(step, src, blockers):
+    # breadth-first from src, one move per ring
+    dist = [-1] * 64
+    dist[src] = 0
+    seen = 1 << src | blockers
+    frontier = [src]
+    d = 0
+    while frontier:
+        d += 1
+        ring = []
+        for sq in frontier:
+            new = step(sq, blockers) & ~seen
+            seen |= new
+            for to in bits(new):
+                dist[to] = d
+                ring.append(to)
+        frontier = ring
+    return dist
+
+
+@lru_cache(maxsize=256)
+def table(piece: str, blockers: int = 0, side: int = 0) -> array:
+    """
+    :param piece: any of bitboard.PIECES
+    :param blockers: mask of squares that can't be entered or passed
+    :param side: only matters for pawns, 0 moves up the board like player A
+    :return: array('b') of 64 * 64 distances, [start * 64 + end]
+    """
+    if piece not in PIECES: raise ValueError("unknown piece %r" % piece)
+    step = PAWN_STEPS[side] if piece == 'pawn' else STEPS[piece]
+    out = array('b')
+    for src in range(64):
+        # the piece itself doesn't block its own way
+        out.extend(_search(step, src, blockers & ~(1 << src)))
+    return out
+
+
+# empty-board tables, built once at import
+EMPTY = {piece: table(piece) for piece in PIECES}
+
+
+def _square(sq):
+    return sq if isinstance(sq, int) else INDEX[sq]
+
+
+def distance(piece, start, end, blockers=0, side=0) -> int:
+    """
+    :param start: square index or ('a', 1) style tuple, same for end
+    """
+    return table(piece, blockers, side)[_square(start) * 64 + _square(end)]
+
+
+def distances(piece, starts, ends, blockers=0, side=0):
+    """
+    distance() for many pairs in one go
+    :param starts: square indexes, an array or any sequence
+    :param ends: as many square indexes
+    :return: int8 numpy array, or a list without numpy
+    """
+    flat = table(piece, blockers, side)
+    if np is None:
+        return [flat[s * 64 + e] for s, e in zip(starts, ends)]
+    grid = np.frombuffer(flat, dtype=np.int8).reshape(64, 64)
+    return grid[np.asarray(starts, dtype=np.intp), np.asarray(ends, dtype=np.intp)]
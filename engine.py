@@ -0,0 +1,373 @@
+"""
+a computer player for Chess: negamax alpha-beta with iterative deepening
+
+every iteration searches one ply deeper than the last, with the best move
+found so far tried first. the search stops hard once the time budget per
+move is used up and falls back on the last iteration that finished
+
+positions already searched, this iteration or an earlier one, are looked
+up in a transposition table (see transposition.py) that also hands back
+the move to try first. endings a tablebase (see tablebase.py) has solved
+aren't searched at all
+
+    from engine import Engine
+    Chess(player_A, player_B, engines=(None, Engine(time_limit=2)))
+"""
+import multiprocessing
+import random
+import time
+from multiprocessing import shared_memory
+
+from bitboard import CODE
+import tablebase
+from moves import unpack
+from transposition import BUCKET, EXACT, LOWER, UPPER, TranspositionTable, buckets
+
+# material in pawns*100 for move ordering, evaluate() goes by the weights
+# Chess was set up with; the king is worth more than everything else
+# combined since losing it ends the game
+VALUES = {'pawn': 100, 'knight': 320, 'bishop': 330, 'castle': 500, 'queen': 900, 'king': 20000}
+MATE = 1000000
+MATED = MATE - 1000  # scores past this are a king lost so many plies on
+CHECK_EVERY = 64  # nodes between looks at the clock
+# VALUES by piece code, for reading straight off Chess.board and packed moves
+CODE_VALUES = [0] * 7
+for _key, _value in VALUES.items():
+    CODE_VALUES[CODE[_key]] = _value
+
+
+class Timeout(Exception):
+    pass
+
+
+def _to_table(score, ply):
+    # the table holds mate scores counted from the position itself, not
+    # from the root, so they still hold when it's reached at another ply
+    if score >= MATED: return score + ply
+    if score <= -MATED: return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score >= MATED: return score - ply
+    if score <= -MATED: return score + ply
+    return score
+
+
+class Engine:
+    def __init__(self, time_limit: float = 1.0, max_depth: int = 64, hash_mb: float = 16,
+                 table: TranspositionTable = None, tablebases=None):
+        """
+        :param time_limit: seconds allowed per move
+        :param max_depth: stop deepening here even with time left
+        :param hash_mb: memory budget of the transposition table, 0 for none
+        :param table: a table to use instead, kept as is across moves
+        :param tablebases: directory of tablebase files, or a list of
+        opened Tablebases
+        """
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.table = table if table is not None else TranspositionTable(hash_mb) if hash_mb else None
+        if isinstance(tablebases, str): tablebases = tablebase.open_all(tablebases)
+        self.tablebases = tablebases or []
+        self.nodes = 0
+        self.next_check = 0  # node count at which to look at the clock again
+        self.deadline = 0.0
+        self.stop = None  # an Event that ends the search early once set, see ParallelEngine
+
+    def __call__(self, game):
+        return self.choose(game)
+
+    def choose(self, game):
+        return self.search(game)[0]
+
+    def search(self, game, start=1):
+        """
+        :param start: depth of the first iteration
+        :return: (best move, score for the side to move, depth completed);
+        the search runs on packed moves, best comes back as a legal_moves
+        tuple
+        """
+        self.nodes = self.next_check = 0
+        self.deadline = time.perf_counter() + self.time_limit
+        if self.small(game):
+            solved = tablebase.best_move(self.tablebases, game)
+            if solved: return unpack(solved[0]), self.solved(solved[1], 0), 0
+        moves = self.order(game, game.packed_moves())
+        if not moves: return None, 0, 0
+        entry = self.table.probe(game.key) if self.table else None
+        if entry and entry[0] in moves:  # from an earlier move, or another worker
+            moves.remove(entry[0])
+            moves.insert(0, entry[0])
+        best, score, depth = moves[0], 0, 0
+        for d in range(start, self.max_depth + 1):
+            try:
+                result = self.root(game, moves, d)
+            except Timeout:
+                break
+            best, score, depth = result + (d,)
+            if self.table: self.table.store(game.key, best, d, EXACT, score)
+            # best move of this iteration leads the next one
+            moves.remove(best)
+            moves.insert(0, best)
+            if abs(score) >= MATE - self.max_depth: break  # forced result, no need to go on
+            if self.out_of_time(): break
+        return unpack(best), score, depth
+
+    def out_of_time(self):
+        return time.perf_counter() >= self.deadline or self.stop is not None and self.stop.is_set()
+
+    def check(self):
+        # every CHECK_EVERY nodes from negamax and quiesce alike, a count
+        # that can't be stepped over the way a multiple can
+        self.next_check = self.nodes + CHECK_EVERY
+        if self.out_of_time(): raise Timeout
+
+    def root(self, game, moves, depth):
+        alpha, best = -MATE - 1, moves[0]
+        for move in moves:
+            game.make_move(move)
+            try:
+                score = -self.negamax(game, depth - 1, -MATE - 1, -alpha, 1)
+            finally:
+                game.unmake_move()
+            if score > alpha: alpha, best = score, move
+        return best, alpha
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes >= self.next_check: self.check()
+        # the side to move has lost its king, sooner is worse
+        if 'king' not in game.sides()[0]: return -MATE + ply
+        if self.small(game):
+            found = tablebase.probe(self.tablebases, game)
+            if found: return self.solved(found, ply)
+        if depth <= 0: return self.quiesce(game, alpha, beta, ply)
+        table, hashed = self.table, 0
+        if table:
+            entry = table.probe(game.key)
+            if entry:
+                hashed, stored, bound, score = entry
+                score = _from_table(score, ply)
+                if stored >= depth and (bound == EXACT or bound == LOWER and score >= beta
+                                        or bound == UPPER and score <= alpha):
+                    return score
+        moves = game.packed_moves()
+        if not moves: return 0
+        moves = self.order(game, moves)
+        if hashed in moves:  # a clash of keys can hand back any move
+            moves.remove(hashed)
+            moves.insert(0, hashed)
+        floor, best = alpha, 0
+        for move in moves:
+            game.make_move(move)
+            try:
+                score = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.unmake_move()
+            if score >= beta:
+                if table: table.store(game.key, move, depth, LOWER, _to_table(score, ply))
+                return score
+            if score > alpha: alpha, best = score, move
+        if table:
+            if alpha > floor: table.store(game.key, best, depth, EXACT, _to_table(alpha, ply))
+            else: table.store(game.key, 0, depth, UPPER, _to_table(alpha, ply))
+        return alpha
+
+    def quiesce(self, game, alpha, beta, ply):
+        # only knockouts from here on, so the score isn't taken in the
+        # middle of an exchange
+        self.nodes += 1
+        if self.nodes >= self.next_check: self.check()
+        stand = self.evaluate(game)
+        if stand >= beta: return stand
+        if stand > alpha: alpha = stand
+        board = game.board
+        captures = [m for m in game.packed_moves() if board[m >> 6 & 63]]
+        for move in self.order(game, captures):
+            game.make_move(move)
+            try:
+                if 'king' not in game.sides()[0]: return MATE - ply - 1  # knocked out on the next ply
+                score = -self.quiesce(game, -beta, -alpha, ply + 1)
+            finally:
+                game.unmake_move()
+            if score >= beta: return score
+            if score > alpha: alpha = score
+        return alpha
+
+    def small(self, game):
+        # few enough pieces left for a tablebase to be worth asking
+        return self.tablebases and len(game.pieces[0]) + len(game.pieces[1]) <= 3
+
+    @staticmethod
+    def solved(found, ply):
+        # a tablebase Probe as a search score at ply
+        if found.result == tablebase.WIN: return MATE - ply - found.plies
+        if found.result == tablebase.LOSS: return -(MATE - ply - found.plies)
+        return 0
+
+    @staticmethod
+    def order(game, moves):
+        # most valuable victim first, cheapest attacker breaking ties, then
+        # the quiet moves
+        board = game.board
+
+        def rank(move):
+            target = board[move >> 6 & 63]
+            if not target: return 0
+            return CODE_VALUES[abs(target)] * 10 - CODE_VALUES[move >> 12 & 7] // 100
+        return sorted(moves, key=rank, reverse=True)
+
+    @staticmethod
+    def evaluate(game):
+        # Chess.value (material and piece-square, see evaluation.py) from
+        # the side to move's point of view
+        return -game.value if game.turn else game.value
+
+
+def _score(task):
+    # worker side of analyse: full-window search below one root move
+    from chess import Chess
+    a, b, turn, move, depth, hash_mb = task
+    game = Chess(a, b, interactive=False, turn=turn)
+    engine = Engine(time_limit=float('inf'), hash_mb=hash_mb)
+    engine.deadline = float('inf')
+    game.make_move(move)
+    score = -engine.negamax(game, depth - 1, -MATE - 1, MATE + 1, 1)
+    return move, score, engine.nodes
+
+
+def analyse(game, depth, workers=None, hash_mb=16):
+    """
+    fixed-depth search of every root move, each in its own worker process;
+    no window is shared between them so every score is exact
+    :param workers: pool size, every core by default
+    :param hash_mb: transposition table budget for each worker
+    :return: [(move, score, nodes)] best first, scores for the side to move
+    """
+    tasks = [(game.a, game.b, game.turn, move, depth, hash_mb) for move in game.legal_moves()]
+    with multiprocessing.Pool(workers) as pool:
+        results = list(pool.imap_unordered(_score, tasks))
+    order = {task[3]: i for i, task in enumerate(tasks)}
+    return sorted(results, key=lambda r: (-r[1], order[r[0]]))
+
+
+# worker side of ParallelEngine: the shared table, the stop event and the
+# tablebases, set up once per process
+_shared = None
+
+
+def _attach(name, stop, tablebases):
+    global _shared
+    block = shared_memory.SharedMemory(name)
+    tables = tablebase.open_all(tablebases) if tablebases else []
+    _shared = block, TranspositionTable(buffer=block.buf), stop, tables
+
+
+def _helper(task):
+    from chess import Chess
+    a, b, turn, start, time_limit, max_depth = task
+    block, table, stop, tables = _shared
+    engine = Engine(time_limit, max_depth, table=table, tablebases=tables)
+    engine.stop = stop
+    move, score, depth = engine.search(Chess(a, b, interactive=False, turn=turn), start)
+    return move, score, depth, engine.nodes
+
+
+class ParallelEngine:
+    """
+    lazy smp: every worker runs the whole iterative deepening search on the
+    same root, half of them one ply ahead of the rest, and they share one
+    transposition table in shared memory. nothing else is passed between
+    them, what one worker stores the others find as cutoffs and first moves,
+    so together they reach a depth sooner than one would alone
+
+    the caller's process searches too and the pool stays up between moves,
+    close() (or a with block) shuts it down
+
+        with ParallelEngine(time_limit=2, workers=8) as engine:
+            Chess(player_A, player_B, engines=(None, engine))
+    """
+    def __init__(self, time_limit: float = 1.0, max_depth: int = 64, workers: int = None,
+                 hash_mb: float = 64, tablebases: str = None):
+        """
+        :param workers: processes searching, this one included; every core
+        by default
+        :param hash_mb: memory budget of the shared table, all workers together
+        :param tablebases: directory of tablebase files, every worker maps
+        its own once when the pool starts
+        """
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.tablebases = tablebase.open_all(tablebases) if tablebases else []
+        self.workers = workers or multiprocessing.cpu_count()
+        self.block = shared_memory.SharedMemory(create=True, size=buckets(hash_mb) * BUCKET)
+        self.table = TranspositionTable(buffer=self.block.buf)
+        self.table.clear()
+        self.stop = multiprocessing.Event()
+        self.pool = None
+        if self.workers > 1:
+            self.pool = multiprocessing.Pool(self.workers - 1, _attach, (self.block.name, self.stop, tablebases))
+        self.nodes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __call__(self, game):
+        return self.choose(game)
+
+    def choose(self, game):
+        return self.search(game)[0]
+
+    def search(self, game):
+        """
+        :return: Engine.search's (best move, score, depth) from whichever
+        worker got deepest, this process's on a tie
+        """
+        self.stop.clear()
+        # copies: apply_async pickles on another thread while the search
+        # below is making and unmaking moves on game's own lists
+        task = ({k: list(v) for k, v in game.a.items()}, {k: list(v) for k, v in game.b.items()}, game.turn)
+        legal = set(game.legal_moves())
+        helpers = [self.pool.apply_async(_helper, (task + (1 + i % 2, self.time_limit, self.max_depth),))
+                   for i in range(1, self.workers)] if self.pool else []
+        engine = Engine(self.time_limit, self.max_depth, table=self.table, tablebases=self.tablebases)
+        engine.stop = self.stop
+        results = [engine.search(game) + (engine.nodes,)]
+        # done here, the helpers stop at their next check
+        self.stop.set()
+        helped = [h.get() for h in helpers]
+        self.nodes = sum(r[3] for r in results + helped)
+        # a helper's answer only counts if it's a move from this position
+        results += [r for r in helped if r[0] in legal]
+        best = max(results, key=lambda r: r[2])  # max keeps the first of equals
+        return best[:3]
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.block:
+            self.table.close()
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+        for table in self.tablebases:
+            table.close()
+        self.tablebases = []
+
+
+class RandomEngine:
+    """
+    picks any legal move, the baseline everything else has to beat
+    """
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def __call__(self, game):
+        moves = game.legal_moves()
+        return self.random.choice(moves) if moves else None
@@ -0,0 +1,78 @@
+"""
+static evaluation: material plus piece-square tables
+
+every (side, piece, square) has one number, the piece's value plus its
+bonus for standing there, negated for player B. a position is worth the
+sum over everything on the board, from player A's point of view, so like
+the zobrist key Chess keeps it current with one addition per piece put
+down or taken off instead of going over both dicts at every leaf
+
+the numbers come from a weights file, see weights.txt for the layout
+
+    tables = load('tuned.txt')
+    Chess(a, b, interactive=False, weights=tables).value
+"""
+import os
+
+from bitboard import PIECES, bits
+
+DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.txt')
+
+
+def parse(lines):
+    """
+    :return: {piece name: (value, 64 bonuses in bitboard order)}
+    """
+    weights = {}
+    key, rows = None, []
+    for number, line in enumerate(lines, 1):
+        line = line.split('#')[0].split()
+        if not line: continue
+        if line[0] in PIECES:
+            if key: raise ValueError("line %d: %s has %d rows, expected 8" % (number, key, len(rows)))
+            if line[0] in weights: raise ValueError("line %d: %s given twice" % (number, line[0]))
+            if len(line) != 2: raise ValueError("line %d: expected '<piece> <value>'" % number)
+            key, value, rows = line[0], int(line[1]), []
+            continue
+        if key is None: raise ValueError("line %d: row before any piece" % number)
+        if len(line) != 8: raise ValueError("line %d: expected 8 numbers, got %d" % (number, len(line)))
+        rows.append([int(x) for x in line])
+        if len(rows) == 8:
+            # the file starts at rank 8, bitboard order at a1
+            weights[key] = (value, tuple(x for r in reversed(rows) for x in r))
+            key = None
+    if key: raise ValueError("%s has %d rows, expected 8" % (key, len(rows)))
+    missing = [k for k in PIECES if k not in weights]
+    if missing: raise ValueError("no weights for %s" % ', '.join(missing))
+    return weights
+
+
+def tables(weights):
+    """
+    :param weights: parse()'s output
+    :return: TABLES[side][piece][sq], what Chess adds up
+    """
+    a = {k: tuple(value + bonus for bonus in squares) for k, (value, squares) in weights.items()}
+    # player B's row r is player A's row 7 - r, and counts against A
+    b = {k: tuple(-a[k][sq ^ 56] for sq in range(64)) for k in a}
+    return a, b
+
+
+def load(path=DEFAULT):
+    with open(path) as f:
+        return tables(parse(f))
+
+
+TABLES = load()
+
+
+def compute(pieces, tables=TABLES) -> int:
+    """
+    value from scratch out of Chess.pieces, Chess only does this once
+    when it's set up
+    """
+    value = 0
+    for side, masks in enumerate(pieces):
+        for key, mask in masks.items():
+            value += sum(tables[side][key][sq] for sq in bits(mask))
+    return value
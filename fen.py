@@ -0,0 +1,104 @@
+"""
+FEN in and out of Chess
+
+player A is white (capital letters) and moves up the board, player B is
+black. a castle is written r like a rook. Chess has no castling rights or
+en passant, so those fields are skipped on the way in and written as '-'
+on the way out
+
+    game = from_fen('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b - - 0 1')
+    for game in load('positions.fen'): ...
+"""
+from bitboard import DECODE, row
+from chess import Chess
+
+LETTERS = {'p': 'pawn', 'n': 'knight', 'b': 'bishop', 'r': 'castle', 'q': 'queen', 'k': 'king'}
+# FEN character -> (side, piece name)
+PIECE_OF = {}
+for _letter, _key in LETTERS.items():
+    PIECE_OF[_letter.upper()] = (0, _key)
+    PIECE_OF[_letter] = (1, _key)
+LETTER_OF = {v: k for k, v in PIECE_OF.items()}
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+
+
+def parse(fen: str):
+    """
+    :return: (a, b, turn, halfmove, fullmove) ready for
+    Chess(a, b, turn=turn, halfmove=halfmove, fullmove=fullmove)
+    """
+    fields = fen.split()
+    if not fields: raise ValueError("empty FEN")
+    ranks = fields[0].split('/')
+    if len(ranks) != 8: raise ValueError("%r: expected 8 rows, got %d" % (fen, len(ranks)))
+    players = ({}, {})
+    for i, line in enumerate(ranks):
+        rank = 8 - i
+        f = 0
+        for ch in line:
+            if ch in '12345678':
+                f += int(ch)
+                continue
+            if ch not in PIECE_OF or f > 7: raise ValueError("%r: bad row %r" % (fen, line))
+            side, key = PIECE_OF[ch]
+            pcs = players[side].get(key)
+            if pcs is None: players[side][key] = [(row[f], rank)]
+            else: pcs.append((row[f], rank))
+            f += 1
+        if f != 8: raise ValueError("%r: row %r doesn't cover 8 squares" % (fen, line))
+    turn = fields[1] if len(fields) > 1 else 'w'
+    if turn not in ('w', 'b'): raise ValueError("%r: side to move must be w or b" % fen)
+    # the two counters are optional, like everything after the board
+    try:
+        halfmove = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError: raise ValueError("%r: move counters must be numbers" % fen) from None
+    return players[0], players[1], 0 if turn == 'w' else 1, halfmove, fullmove
+
+
+def from_fen(fen: str, cls=Chess):
+    a, b, turn, halfmove, fullmove = parse(fen)
+    return cls(a, b, interactive=False, turn=turn, halfmove=halfmove, fullmove=fullmove)
+
+
+def to_fen(game) -> str:
+    ranks = []
+    for rank in range(8, 0, -1):
+        line, empty = [], 0
+        for f in range(8):
+            piece = DECODE[game.board[(rank - 1) * 8 + f]]
+            if piece is None:
+                empty += 1
+                continue
+            if empty: line.append(str(empty))
+            line.append(LETTER_OF[piece])
+            empty = 0
+        if empty: line.append(str(empty))
+        ranks.append(''.join(line))
+    return '%s %s - - %d %d' % ('/'.join(ranks), 'wb'[game.turn], game.halfmove, game.fullmove)
+
+
+def read(lines, raw=False):
+    """
+    one position per FEN line, blank lines and lines starting with # are
+    skipped. a generator, nothing is kept once it's been handed out
+    :param lines: any iterable of strings, an open file for instance
+    :param raw: yield parse()'s (a, b, turn, halfmove, fullmove) instead of
+    building a Chess for each
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] == '#': continue
+        position = parse(line)
+        if raw: yield position
+        else:
+            a, b, turn, halfmove, fullmove = position
+            yield Chess(a, b, interactive=False, turn=turn, halfmove=halfmove, fullmove=fullmove)
+
+
+def load(path, raw=False):
+    """
+    read() straight from a file, streamed line by line
+    """
+    with open(path) as lines:
+        yield from read(lines, raw)
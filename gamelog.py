@@ -0,0 +1,138 @@
+"""
+append-only binary store of finished games
+
+two files side by side: <path> holds the games back to back, <path>.idx one
+little-endian uint64 offset per game into it. a game is an 8 byte header
+
+    uint32  plies
+    uint8   result, index into RESULTS
+    uint8   flags, unused for now
+    uint16  reserved
+
+followed by its moves, one little-endian uint16 each in the moves.py
+packing. every game starts from the run.py position
+
+writers only ever append, so a reader can mmap both files and hand out any
+game, or any run of games, as views straight into the mapping. a reader
+sees the games that were there when it was opened, and the games it hands
+out have to be let go of before it's closed
+
+    with GameLog('games.bin') as log: log.append(moves, 'draw')
+    with GameReader('games.bin') as games: games[12345].moves
+"""
+import mmap
+import os
+import struct
+import sys
+
+from chess import Chess
+from run import player_A, player_B
+
+HEADER = struct.Struct('<IBBH')
+OFFSET = struct.Struct('<Q')
+RESULTS = Chess.names + ('draw',)
+
+
+class GameLog:
+    def __init__(self, path):
+        self.path = path
+        self.data = open(path, 'ab')
+        self.index = open(path + '.idx', 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, moves, result):
+        """
+        :param moves: packed moves in the order they were played
+        :param result: one of RESULTS
+        :return: the game's number in the log
+        """
+        offset = self.data.tell()
+        self.data.write(HEADER.pack(len(moves), RESULTS.index(result), 0, 0))
+        self.data.write(struct.pack('<%dH' % len(moves), *moves))
+        # the index entry goes last, a game only exists once it's complete
+        self.data.flush()
+        self.index.write(OFFSET.pack(offset))
+        self.index.flush()
+        return self.index.tell() // OFFSET.size - 1
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class Game:
+    """
+    one game of a GameReader, moves is a memoryview of uint16 into the map
+    """
+    __slots__ = ('number', 'result', 'moves')
+
+    def __init__(self, number, result, moves):
+        self.number = number
+        self.result = result
+        self.moves = moves
+
+    def __repr__(self):
+        return "Game(%d, %s, %d plies)" % (self.number, self.result, len(self.moves))
+
+    def replay(self):
+        """
+        :return: generator of the game after every move, one Chess reused
+        """
+        game = Chess({k: list(v) for k, v in player_A.items()},
+                     {k: list(v) for k, v in player_B.items()}, interactive=False)
+        for move in self.moves:
+            game.make_move(move)
+            yield game
+
+
+class GameReader:
+    def __init__(self, path):
+        self.path = path
+        self._files = [open(path, 'rb'), open(path + '.idx', 'rb')]
+        # mmap can't map an empty file, an empty log is just empty bytes
+        self._maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size
+                      else b'' for f in self._files]
+        self.data = memoryview(self._maps[0])
+        self.offsets = memoryview(self._maps[1]).cast('Q')
+        if sys.byteorder != 'little':  # the file is little-endian whatever the machine
+            self.offsets = [OFFSET.unpack_from(self._maps[1], i * OFFSET.size)[0]
+                            for i in range(len(self._maps[1]) // OFFSET.size)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[i] for i in range(*number.indices(len(self)))]
+        if number < 0: number += len(self)
+        offset = self.offsets[number]
+        plies, result, flags, reserved = HEADER.unpack_from(self.data, offset)
+        start = offset + HEADER.size
+        moves = self.data[start:start + 2 * plies]
+        if sys.byteorder == 'little': moves = moves.cast('H')
+        else: moves = struct.unpack('<%dH' % plies, moves)
+        return Game(number, RESULTS[result], moves)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        # views into the maps have to go before the maps can
+        self.data.release()
+        if isinstance(self.offsets, memoryview): self.offsets.release()
+        for m in self._maps:
+            if m: m.close()
+        for f in self._files:
+            f.close()
@@ -0,0 +1,262 @@
+"""
+a Monte Carlo tree search player for Chess, for when there's nothing
+better to judge a position by than how random games from it end
+
+the tree grows one node per visit: UCT picks a path down from the root,
+the first move there that hasn't been tried yet becomes a new node, and
+light playouts (uniformly random moves) from it decide what the visit was
+worth. every round picks several leaves at once, each path carrying a
+virtual loss until its playouts are in so the next pick goes elsewhere,
+and plays them all out together, in this process or across a pool
+
+the search is anytime: stop it whenever, the move played out most is the
+answer
+
+    with MCTS(time_limit=2, workers=8) as player:
+        Chess(player_A, player_B, engines=(None, player))
+"""
+import math
+import multiprocessing
+import random
+import time
+
+from bitboard import CODE, bits
+from moves import PROMOTION, unpack
+
+DRAW = 2  # a playout's outcome is the winning side, 0 or 1, or this
+
+
+class Node:
+    __slots__ = ('move', 'side', 'parent', 'children', 'untried', 'visits', 'wins', 'virtual', 'terminal')
+
+    def __init__(self, move, side, parent):
+        """
+        :param move: packed move that leads here from parent
+        :param side: who played it; wins are counted for that side
+        """
+        self.move = move
+        self.side = side
+        self.parent = parent
+        self.children = []
+        self.untried = None  # packed moves not expanded yet, listed on the first visit
+        self.visits = 0
+        self.wins = 0.0
+        self.virtual = 0  # playouts under way below this node
+        self.terminal = None  # the outcome when the game is over here
+
+    def uct(self, log_total, c):
+        # unfinished playouts count as losses for now
+        n = self.visits + self.virtual
+        return self.wins / n + c * math.sqrt(log_total / n)
+
+
+def random_move(game, rng):
+    """
+    one of game.packed_moves() picked uniformly, without listing them all:
+    count each piece's targets, pick a number and find the move it lands on
+    :return: the packed move, None when the side to move is stuck
+    """
+    side = game.turn
+    options, total = [], 0
+    for key, mask in game.pieces[side].items():
+        targets = game.targets[key]
+        for sq in bits(mask):
+            t = targets(sq, side)
+            if t:
+                options.append((key, sq, t))
+                total += t.bit_count()
+    if not total: return None
+    r = rng.randrange(total)
+    for key, sq, t in options:
+        n = t.bit_count()
+        if r >= n:
+            r -= n
+            continue
+        for _ in range(r):
+            t &= t - 1  # drop the lowest target
+        move = sq | (t & -t).bit_length() - 1 << 6 | CODE[key] << 12
+        if key == 'pawn' and sq // 8 == (6 if side == 0 else 1): move |= PROMOTION
+        return move
+
+
+def playout(game, rng, max_plies, deadline=float('inf')):
+    """
+    random moves until a king is knocked out, the side to move is stuck or
+    max_plies have been played, then take them all back
+    :param deadline: time.perf_counter() past which the game is given up
+    :return: the winning side, DRAW, or None when given up
+    """
+    made, winner = 0, DRAW
+    while made < max_plies:
+        if time.perf_counter() >= deadline:
+            winner = None
+            break
+        move = random_move(game, rng)
+        if move is None: break
+        side = game.turn
+        captured = game.make_move(move)
+        made += 1
+        if captured and captured[1] == 'king':
+            winner = side
+            break
+    for _ in range(made):
+        game.unmake_move()
+    return winner
+
+
+def _run(game, path, playouts, rng, max_plies, deadline):
+    # outcomes of the playouts from the end of path that finished in time,
+    # game comes back as it was
+    for move in path:
+        game.make_move(move)
+    try:
+        outcomes = []
+        for _ in range(playouts):
+            winner = playout(game, rng, max_plies, deadline)
+            if winner is None: break
+            outcomes.append(winner)
+        return outcomes
+    finally:
+        for _ in path:
+            game.unmake_move()
+
+
+# worker side: the last root seen, set up again only when it changes
+_root = None
+
+
+def _leaf(task):
+    global _root
+    from chess import Chess
+    a, b, turn, key, path, playouts, seed, max_plies, remaining = task
+    # the time left rather than the deadline, clocks needn't agree across processes
+    deadline = time.perf_counter() + remaining
+    if _root is None or _root.key != key:
+        _root = Chess(a, b, interactive=False, turn=turn)
+    return _run(_root, path, playouts, random.Random(seed), max_plies, deadline)
+
+
+class MCTS:
+    def __init__(self, time_limit: float = 1.0, batch: int = 8, playouts: int = 1,
+                 workers: int = 0, c: float = 1.4, max_plies: int = 200, seed=None):
+        """
+        :param time_limit: seconds per move when search() isn't given a deadline
+        :param batch: leaves picked per round, under virtual loss
+        :param playouts: random games played from each leaf
+        :param workers: play the rounds out over a pool this size, 0 keeps
+        everything in this process
+        :param c: UCT exploration constant
+        :param max_plies: a playout this long is called a draw
+        """
+        self.time_limit = time_limit
+        self.batch = batch
+        self.playouts = playouts
+        self.c = c
+        self.max_plies = max_plies
+        self.random = random.Random(seed)
+        self.pool = multiprocessing.Pool(workers) if workers else None
+        self.root = None
+        self.rounds = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __call__(self, game):
+        return self.choose(game)
+
+    def choose(self, game):
+        return self.search(game)[0]
+
+    def search(self, game, deadline=None, rounds=None):
+        """
+        :param deadline: time.perf_counter() to stop at, time_limit from
+        now by default
+        :param rounds: stop after this many rounds even with time left
+        :return: (best move as a legal_moves tuple, its visits, its win
+        rate), the move is None when the side to move has none
+        """
+        if deadline is None: deadline = time.perf_counter() + self.time_limit
+        self.root = Node(None, 1 - game.turn, None)
+        self.rounds = 0
+        if game.result(): return None, 0, 0.0
+        while time.perf_counter() < deadline and (rounds is None or self.rounds < rounds):
+            leaves = [self.select(game) for _ in range(self.batch)]
+            self.backup(leaves, self.play(game, leaves, deadline))
+            self.rounds += 1
+            if self.root.terminal is not None: break
+        if not self.root.children: return None, 0, 0.0
+        best = max(self.root.children, key=lambda n: n.visits)
+        return unpack(best.move), best.visits, best.wins / best.visits if best.visits else 0.0
+
+    def select(self, game):
+        """
+        walk down by UCT from the root, adding one node at the end
+        :return: (path of nodes, their moves)
+        """
+        node, nodes, path = self.root, [self.root], []
+        while node.terminal is None:
+            if node.untried is None:
+                node.untried = game.packed_moves()
+                self.random.shuffle(node.untried)
+                if not node.untried:
+                    node.terminal = DRAW  # stuck
+                    break
+            if node.untried:
+                move = node.untried.pop()
+                side = game.turn
+                captured = game.make_move(move)
+                path.append(move)
+                child = Node(move, side, node)
+                if captured and captured[1] == 'king': child.terminal = side
+                node.children.append(child)
+                nodes.append(child)
+                break
+            log_total = math.log(node.visits + node.virtual)
+            node = max(node.children, key=lambda n: n.uct(log_total, self.c))
+            game.make_move(node.move)
+            path.append(node.move)
+            nodes.append(node)
+        for _ in path:
+            game.unmake_move()
+        for n in nodes:
+            n.virtual += self.playouts
+        return nodes, path
+
+    def play(self, game, leaves, deadline):
+        # one list of outcomes per leaf, finished games aren't played out;
+        # playouts still going at the deadline are dropped
+        todo = [i for i, (nodes, path) in enumerate(leaves) if nodes[-1].terminal is None]
+        if self.pool:
+            remaining = deadline - time.perf_counter()
+            tasks = [(game.a, game.b, game.turn, game.key, leaves[i][1], self.playouts,
+                      self.random.getrandbits(64), self.max_plies, remaining) for i in todo]
+            outcomes = self.pool.map(_leaf, tasks)
+        else:
+            outcomes = [_run(game, leaves[i][1], self.playouts, self.random, self.max_plies, deadline)
+                        for i in todo]
+        results = [[nodes[-1].terminal] * self.playouts for nodes, path in leaves]
+        for i, outcome in zip(todo, outcomes):
+            results[i] = outcome
+        return results
+
+    def backup(self, leaves, results):
+        for (nodes, path), outcome in zip(leaves, results):
+            for n in nodes:
+                n.virtual -= self.playouts
+                n.visits += len(outcome)
+                n.wins += sum(1.0 if w == n.side else 0.5 if w == DRAW else 0.0 for w in outcome)
+            leaf = nodes[-1]
+            if not leaf.visits and not leaf.virtual and leaf.parent:
+                # added this round and never played out, it goes back to
+                # being untried
+                leaf.parent.children.remove(leaf)
+                leaf.parent.untried.append(leaf.move)
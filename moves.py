@@ -0,0 +1,54 @@
+"""
+compact moves: a whole move packed into one 16-bit int
+
+    bits 0-5    from square (bitboard index, a1 = 0)
+    bits 6-11   to square
+    bits 12-14  piece code, see bitboard.CODE
+    bit 15      set when a pawn reaches the last row and gets replaced
+
+the (piece name, from, to) tuples of Chess.legal_moves are still what the
+console, pgn and fen deal in; pack/unpack convert at that edge
+"""
+from bitboard import CODE, INDEX, PIECES, SQUARES
+
+PROMOTION = 1 << 15
+
+
+def pack(move) -> int:
+    key, pc, mv = move
+    packed = INDEX[pc] | INDEX[mv] << 6 | CODE[key] << 12
+    if key == 'pawn' and mv[1] in (1, 8): packed |= PROMOTION
+    return packed
+
+
+def unpack(packed: int) -> tuple:
+    return PIECES[(packed >> 12 & 7) - 1], SQUARES[packed & 63], SQUARES[packed >> 6 & 63]
+
+
+class Move:
+    """
+    readable view of a packed move, for when attributes beat bit twiddling
+    """
+    __slots__ = ('frm', 'to', 'piece', 'promotion')
+
+    def __init__(self, packed: int):
+        self.frm = packed & 63
+        self.to = packed >> 6 & 63
+        self.piece = PIECES[(packed >> 12 & 7) - 1]
+        self.promotion = bool(packed & PROMOTION)
+
+    def __int__(self):
+        return self.frm | self.to << 6 | CODE[self.piece] << 12 | (PROMOTION if self.promotion else 0)
+
+    def __repr__(self):
+        return "Move(%s %s%d-%s%d%s)" % ((self.piece,) + SQUARES[self.frm] + SQUARES[self.to]
+                                        + ('=' if self.promotion else '',))
+
+    def __eq__(self, other):
+        return isinstance(other, Move) and int(self) == int(other)
+
+    def __hash__(self):
+        return int(self)
+
+    def tuple(self):
+        return self.piece, SQUARES[self.frm], SQUARES[self.to]
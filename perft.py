@@ -0,0 +1,278 @@
+"""
+perft: walk the move tree of a Chess position to a fixed depth and count
+the leaves. the counts check the move methods against known numbers, the
+timings tell us how fast they are
+
+a position where a king has been knocked out is over and has no moves, so
+it only counts as a leaf when the depth runs out right there
+
+    python perft.py [depth] [position ...] [-j workers]
+    python perft.py --verify [games] [position ...]
+
+with -j the last depth is split over the root moves, each move's subtree
+counted in its own worker process, and printed move by move (divide)
+
+--verify plays random games from each position instead and checks the
+incremental state against a Chess built from scratch after every move,
+then takes the moves back one by one checking each position comes back
+exactly as it was
+"""
+import multiprocessing
+import random
+import sys
+import time
+
+from chess import Chess
+from run import player_A, player_B
+
+# hand-built positions besides the starting one, same layout as run.py;
+# turn is the side to move, 0 for player A
+POSITIONS = {
+    'start': (player_A, player_B, 0),
+    'promotion': ({
+        'pawn': [('b', 7), ('g', 7), ('d', 2)],
+        'castle': [('a', 1)],
+        'queen': [('d', 1)],
+        'king': [('e', 1)],
+    }, {
+        'pawn': [('a', 7), ('e', 7), ('h', 2)],
+        'knight': [('c', 8)],
+        'castle': [('f', 8)],
+        'king': [('e', 8)],
+    }, 0),
+    'middlegame': ({
+        'pawn': [('a', 2), ('b', 2), ('c', 3), ('d', 4), ('e', 4), ('f', 2), ('g', 2), ('h', 3)],
+        'castle': [('a', 1), ('f', 1)],
+        'knight': [('f', 3)],
+        'bishop': [('c', 4), ('g', 5)],
+        'queen': [('d', 1)],
+        'king': [('g', 1)],
+    }, {
+        'pawn': [('a', 7), ('b', 5), ('c', 7), ('d', 6), ('e', 5), ('f', 7), ('g', 7), ('h', 6)],
+        'castle': [('a', 8), ('f', 8)],
+        'knight': [('c', 6), ('f', 6)],
+        'bishop': [('c', 8), ('e', 7)],
+        'queen': [('d', 8)],
+        'king': [('g', 8)],
+    }, 1),
+}
+
+# leaf counts per depth for the rules Chess plays by: no check, the game
+# ends when a king is knocked out and a pawn on the last row is replaced by
+# whatever replace_pawn hands back. up to depth 3 from the start these are
+# the usual chess numbers, deeper ones were cross-checked against a plain
+# square-by-square move generator written separately
+REFERENCE = {
+    'start': {1: 20, 2: 400, 3: 8902, 4: 197742, 5: 4896998},
+    'promotion': {1: 26, 2: 476, 3: 14505, 4: 299652, 5: 9970602},
+    'middlegame': {1: 33, 2: 1380, 3: 45761, 4: 1888988, 5: 63652738},
+}
+
+
+def position(name, cls=Chess):
+    """
+    :return: a fresh headless Chess (or cls) for one of POSITIONS, the
+    dicts are copied so the originals stay untouched
+    """
+    a, b, turn = POSITIONS[name]
+    return cls({k: list(v) for k, v in a.items()}, {k: list(v) for k, v in b.items()},
+               interactive=False, turn=turn)
+
+
+def perft(game, depth):
+    if depth == 0: return 1
+    if 'king' not in game.a or 'king' not in game.b: return 0
+    moves = game.legal_moves()
+    if depth == 1: return len(moves)
+    nodes = 0
+    for move in moves:
+        game.make_move(move)
+        nodes += perft(game, depth - 1)
+        game.unmake_move()
+    return nodes
+
+
+def divide(game, depth):
+    """
+    :return: {move: leaf count below it} for every move at the root
+    """
+    counts = {}
+    for move in game.legal_moves():
+        game.make_move(move)
+        counts[move] = perft(game, depth - 1)
+        game.unmake_move()
+    return counts
+
+
+def _count(task):
+    # worker side of parallel_divide: rebuild the position, play the root
+    # move, count what's below it
+    a, b, turn, move, depth = task
+    game = Chess(a, b, interactive=False, turn=turn)
+    game.make_move(move)
+    return move, perft(game, depth - 1)
+
+
+def parallel_divide(game, depth, workers=None):
+    """
+    divide() with every root move's subtree counted in a separate process
+    :param workers: pool size, every core by default
+    :return: {move: leaf count below it}, in legal_moves order
+    """
+    if depth < 1 or 'king' not in game.a or 'king' not in game.b: return {}
+    moves = game.legal_moves()
+    tasks = [(game.a, game.b, game.turn, move, depth) for move in moves]
+    with multiprocessing.Pool(workers) as pool:
+        counts = dict(pool.imap_unordered(_count, tasks))
+    return {move: counts[move] for move in moves}
+
+
+def profiled(stats):
+    """
+    :return: a Chess subclass whose move methods add their calls, moves
+    produced and time spent into stats[piece name]
+    """
+    def timed(key, move):
+        def wrapper(self, pc, player, opponent):
+            t = time.perf_counter()
+            moves = move(self, pc, player, opponent)
+            entry = stats.setdefault(key, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += len(moves)
+            entry[2] += time.perf_counter() - t
+            return moves
+        return wrapper
+
+    class Profiled(Chess):
+        pass
+    for key in ('pawn', 'knight', 'bishop', 'castle', 'queen', 'king'):
+        name = 'move_' + key
+        setattr(Profiled, name, timed(key, getattr(Chess, name)))
+    return Profiled
+
+
+def run(name, depth, out=print):
+    """
+    report nodes and nodes/sec for every depth up to depth, then per move
+    method, against REFERENCE where there's a number for it
+    :return: False if any count is off
+    """
+    ok = True
+    stats = {}
+    cls = profiled(stats)
+    out("%s" % name)
+    for d in range(1, depth + 1):
+        game = position(name, cls)
+        t = time.perf_counter()
+        nodes = perft(game, d)
+        elapsed = time.perf_counter() - t
+        expected = REFERENCE.get(name, {}).get(d)
+        if expected is None: check = ''
+        elif expected == nodes: check = 'ok'
+        else:
+            check = 'MISMATCH, expected %d' % expected
+            ok = False
+        out("  depth %d %12d nodes %9.3fs %12.0f nodes/sec %s"
+            % (d, nodes, elapsed, nodes / elapsed if elapsed else 0, check))
+    for key, (calls, moves, elapsed) in sorted(stats.items()):
+        out("  %-7s %10d calls %10d moves %9.3fs %12.0f calls/sec"
+            % (key, calls, moves, elapsed, calls / elapsed if elapsed else 0))
+    return ok
+
+
+def run_parallel(name, depth, workers=None, out=print):
+    """
+    depth split over the root moves, reported per move and in total
+    :return: False if the total is off
+    """
+    game = position(name)
+    t = time.perf_counter()
+    counts = parallel_divide(game, depth, workers)
+    elapsed = time.perf_counter() - t
+    out("%s divide %d" % (name, depth))
+    for (key, pc, mv), nodes in counts.items():
+        out("  %-6s %s%d-%s%d %12d" % (key, pc[0], pc[1], mv[0], mv[1], nodes))
+    nodes = sum(counts.values())
+    expected = REFERENCE.get(name, {}).get(depth)
+    check = '' if expected is None else 'ok' if expected == nodes else 'MISMATCH, expected %d' % expected
+    out("  total %d nodes %9.3fs %12.0f nodes/sec %s"
+        % (nodes, elapsed, nodes / elapsed if elapsed else 0, check))
+    return expected is None or expected == nodes
+
+
+def _state(game):
+    # everything make_move touches, dict and list order included
+    return ([(k, list(v)) for k, v in game.a.items()], [(k, list(v)) for k, v in game.b.items()],
+            [list(masks.items()) for masks in game.pieces], list(game.occupied), game.board.tobytes(),
+            game.turn, game.key, game.value, game.halfmove, game.fullmove)
+
+
+def _problems(game):
+    # where game's incremental state differs from a fresh build of its dicts
+    fresh = Chess({k: list(v) for k, v in game.a.items()}, {k: list(v) for k, v in game.b.items()},
+                  interactive=False, turn=game.turn, weights=game.weights)
+    found = []
+    for side, player in enumerate((game.a, game.b)):
+        if list(game.pieces[side]) != list(player): found.append('pieces[%d] key order' % side)
+        if game.pieces[side] != fresh.pieces[side]: found.append('pieces[%d]' % side)
+        if game.attacked(side) != fresh.attacked(side): found.append('attacked(%d)' % side)
+        if game.attacks[side] != fresh.attacks[side]: found.append('attacks[%d]' % side)
+    if game.occupied != fresh.occupied: found.append('occupied')
+    if game.board != fresh.board: found.append('board')
+    if game.key != fresh.key: found.append('key')
+    if game.value != fresh.value: found.append('value')
+    return found
+
+
+def verify(name, games, max_plies=200, seed=0, out=print):
+    """
+    random games from a position, each move checked against a fresh build
+    and each unmake_move against the position before the move
+    :return: False at the first difference, which is reported
+    """
+    rng = random.Random(seed)
+    game = position(name)
+    plies = 0
+    for n in range(games):
+        states = []
+        while len(states) < max_plies and 'king' in game.a and 'king' in game.b:
+            moves = game.packed_moves()
+            if not moves: break
+            states.append(_state(game))
+            game.make_move(rng.choice(moves))
+            found = _problems(game)
+            if found:
+                out("%s verify: game %d ply %d after make_move: %s" % (name, n, len(states), ', '.join(found)))
+                return False
+        plies += len(states)
+        while states:
+            game.unmake_move()
+            found = _problems(game)
+            if _state(game) != states.pop(): found.append('not restored')
+            if found:
+                out("%s verify: game %d ply %d after unmake_move: %s" % (name, n, len(states), ', '.join(found)))
+                return False
+    out("%s verify: %d games, %d plies ok" % (name, games, plies))
+    return True
+
+
+def main(argv):
+    workers = None
+    checking = '--verify' in argv
+    if checking: argv = [a for a in argv if a != '--verify']
+    if '-j' in argv:
+        i = argv.index('-j')
+        workers = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    depth = int(argv[0]) if argv else 100 if checking else 3  # games with --verify
+    names = argv[1:] or list(POSITIONS)
+    ok = True
+    for name in names:
+        if checking: ok = verify(name, depth) and ok
+        elif workers: ok = run_parallel(name, depth, workers) and ok
+        else: ok = run(name, depth) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
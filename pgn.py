@@ -0,0 +1,184 @@
+"""
+replay PGN game archives through Chess
+
+everything here is a generator: games are read one at a time and every
+position is handed out as it's reached, so an archive of any size goes
+through in constant memory. each SAN move is matched against the moves
+Chess generates and played with make_move
+
+a few things real chess has and Chess doesn't: castling moves can't be
+replayed, and a promotion becomes whatever replace_pawn picks whatever
+piece the PGN asked for
+
+    for tags, game, move in replay(open('games.pgn')): ...
+    results = map_shards('games.pgn', count_positions, workers=8)
+"""
+import multiprocessing
+import os
+import re
+
+import fen
+
+SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?[NBRQ])?[+#]?[!?]*$')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+
+
+class IllegalMove(ValueError):
+    pass
+
+
+def games(lines):
+    """
+    split a stream of PGN lines into games
+    :return: generator of (tags, movetext) pairs
+    """
+    tags, text = {}, []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            if text:  # tags after movetext start the next game
+                yield tags, '\n'.join(text)
+                tags, text = {}, []
+            tag = TAG.match(line)
+            if tag: tags[tag.group(1)] = tag.group(2)
+        elif line and not line.startswith('%'):
+            text.append(line)
+    if tags or text: yield tags, '\n'.join(text)
+
+
+def tokens(movetext):
+    """
+    the SAN moves of one game, skipping move numbers, comments,
+    variations, NAGs and the result
+    """
+    depth = 0  # inside (variations)
+    i, n = 0, len(movetext)
+    while i < n:
+        ch = movetext[i]
+        if ch == '{':
+            i = movetext.find('}', i)
+            if i < 0: return
+        elif ch == ';':  # comment to the end of the line
+            i = movetext.find('\n', i)
+            if i < 0: return
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif not ch.isspace():
+            j = i
+            while j < n and not movetext[j].isspace() and movetext[j] not in '{}();':
+                j += 1
+            word = movetext[i:j]
+            i = j
+            if depth: continue
+            word = word.split('.')[-1]  # 12.e4 and 12...e5 as well as plain e4
+            if word and word not in RESULTS and word[0] != '$': yield word
+            continue
+        i += 1
+
+
+def resolve(game, san):
+    """
+    :return: the (piece name, from, to) move of game that san stands for
+    """
+    match = SAN.match(san)
+    if not match: raise IllegalMove("%r isn't a move Chess can play" % san)
+    letter, file, rank, target = match.groups()
+    key = fen.LETTERS[letter.lower()] if letter else 'pawn'
+    to = (target[0], int(target[1]))
+    player, opponent = game.sides()
+    move = game.all_moves[key]
+    candidates = [(key, pc, to) for pc in player.get(key, ())
+                  if (not file or pc[0] == file) and (not rank or pc[1] == int(rank))
+                  and to in move(pc, player, opponent)]
+    if len(candidates) > 1:
+        # SAN leaves out pieces that may not move because of check, Chess
+        # has no such rule so drop the ones that hand over the king
+        candidates = [m for m in candidates if not _exposes_king(game, m)]
+    if len(candidates) != 1:
+        raise IllegalMove("%r matches %d moves" % (san, len(candidates)))
+    return candidates[0]
+
+
+def _exposes_king(game, move):
+    side = game.turn
+    game.make_move(move)
+    try:
+        return game.in_check(side)
+    finally:
+        game.unmake_move()
+
+
+def replay(lines, skip_errors=False):
+    """
+    play every game in lines move by move
+    :param skip_errors: drop the rest of a game with a move that can't be
+    replayed and carry on with the next, instead of raising IllegalMove
+    :return: generator of (tags, game, move) after each move. game is the
+    same Chess object for the whole game and changes after every yield,
+    keep fen.to_fen(game) or game.key if you need the position later
+    """
+    for tags, movetext in games(lines):
+        game = fen.from_fen(tags.get('FEN', fen.START))
+        try:
+            for san in tokens(movetext):
+                move = resolve(game, san)
+                game.make_move(move)
+                yield tags, game, move
+        except IllegalMove:
+            if not skip_errors: raise
+
+
+def shards(path, count):
+    """
+    cut the file at path into count byte ranges that each start on a game
+    :return: list of (start, end) offsets
+    """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, count):
+            # one byte back, so a game starting right at the cut isn't skipped
+            f.seek(max(size * i // count - 1, starts[-1]))
+            f.readline()  # most likely landed mid-line
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line or line.startswith(b'[Event '): break
+            if starts[-1] < offset < size: starts.append(offset)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_shard(path, start, end):
+    # lines of the file from start up to end, decoded one at a time
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line: break
+            yield line.decode('utf-8', 'replace')
+
+
+def _run_shard(task):
+    worker, path, start, end = task
+    return worker(replay(read_shard(path, start, end), skip_errors=True))
+
+
+def map_shards(path, worker, workers=None):
+    """
+    replay the file at path across a process pool, one shard per worker
+    :param worker: top level function (so it pickles) that gets a shard's
+    replay() generator and returns something small, a count or a summary
+    :return: worker's results, in file order
+    """
+    workers = workers or os.cpu_count()
+    tasks = [(worker, path, start, end) for start, end in shards(path, workers)]
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(_run_shard, tasks)
+
+
+def count_positions(positions):
+    # a ready made worker for map_shards
+    return sum(1 for _ in positions)
@@ -56,4 +56,5 @@ def move_bishop(start: tuple, end: tuple) -> int:
     return 0
 
 
-print(move_bishop(('d', 4), ('a', 7)))
+if __name__ == '__main__':
+    print(move_bishop(('d', 4), ('a', 7)))
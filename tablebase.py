@@ -0,0 +1,236 @@
+"""
+endgame tablebases for king and one piece against a lone king, solved by
+retrograde analysis, written to disk bit-packed and probed through mmap
+
+every placement of the three kings and pieces with either side to move is
+one entry. the game ends when a king is knocked out, so a win in n means
+the side to move knocks out the other king on ply n whatever the defence,
+a loss in n that it loses its own on ply n, and a draw that neither can
+be forced. the lone king can win too, by standing next to a king that
+walked up to it, and it draws by knocking out the piece when the other
+king can't answer
+
+solving starts from the positions where a king can be knocked out right
+away and works backwards a ply at a time: a position one move from a lost
+position is won, and a position whose every move leads to a won position
+is lost. whatever is left at the end is a draw
+
+a file is a header, then one entry per position of WIDTH bits packed
+little-endian, 0 for a draw and otherwise plies << 1 | lost
+
+    python tablebase.py tables/
+    Engine(time_limit=1, tablebases='tables/')
+"""
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+
+from bitboard import KING, bits, castle_attacks, queen_attacks
+
+PIECES = {'queen': queen_attacks, 'castle': castle_attacks}
+FILES = {'queen': 'kqk.tb', 'castle': 'krk.tb'}  # named like FEN, a castle is an r
+MAGIC = b'CTB1'
+HEADER = struct.Struct('<4s8sBB')  # magic, piece name, entry width in bits, longest win
+SIZE = 2 * 64 * 64 * 64
+WIN, DRAW, LOSS = 1, 0, -1
+
+Probe = namedtuple('Probe', 'result plies')
+
+
+def index(sk, pc, wk, turn):
+    """
+    :param sk: square of the king with the piece
+    :param pc: square of the piece
+    :param wk: square of the lone king
+    :param turn: 0 when the side with the piece is to move, 1 otherwise
+    """
+    return ((turn * 64 + sk) * 64 + pc) * 64 + wk
+
+
+def build(piece):
+    """
+    solve king + piece against king
+    :return: list of SIZE entries, 0 for draws (and for squares doubled
+    up), plies << 1 | lost otherwise, from the side to move's point of view
+    """
+    attacks = PIECES[piece]
+    value = [0] * SIZE
+    count = [0] * SIZE  # moves not known to lose yet; a draw escape keeps it above 0 for good
+    ply = []  # positions solved at the current ply
+    escape = SIZE  # big enough that no count from a position with a drawing exit reaches 0
+    following = []  # and at the next
+    for sk in range(64):
+        for pc in range(64):
+            if pc == sk: continue
+            for wk in range(64):
+                if wk == sk or wk == pc: continue
+                occupied = 1 << sk | 1 << pc | 1 << wk
+                # the side with the piece: knock out the king or move to an empty square
+                i = index(sk, pc, wk, 0)
+                hits = attacks(pc, occupied)
+                if (KING[sk] | hits) >> wk & 1:
+                    value[i] = 1 << 1
+                    ply.append(i)
+                else:
+                    count[i] = (KING[sk] & ~occupied).bit_count() + (hits & ~occupied).bit_count()
+                # the lone king: knock out the king, knock out the piece and leave
+                # a bare king each, or step to an empty square
+                i = index(sk, pc, wk, 1)
+                if KING[wk] >> sk & 1:
+                    value[i] = 1 << 1
+                    ply.append(i)
+                    continue
+                count[i] = (KING[wk] & ~occupied).bit_count()
+                if KING[wk] >> pc & 1:
+                    # with the kings side by side the other king knocks this
+                    # one out next, otherwise it's bare king against bare king
+                    if not KING[sk] >> pc & 1: count[i] += escape
+                    elif not count[i]:
+                        value[i] = 2 << 1 | 1
+                        following.append(i)
+    plies = 1
+    while ply:
+        for i in ply:
+            lost = value[i] & 1
+            turn, rest = divmod(i, 64 ** 3)
+            sk, rest = divmod(rest, 64 * 64)
+            pc, wk = divmod(rest, 64)
+            occupied = 1 << sk | 1 << pc | 1 << wk
+            # positions one move before this one
+            if turn == 1:
+                before = [index(s, pc, wk, 0) for s in bits(KING[sk] & ~occupied)]
+                before += [index(sk, s, wk, 0) for s in bits(attacks(pc, occupied) & ~occupied)]
+            else:
+                before = [index(sk, pc, s, 1) for s in bits(KING[wk] & ~occupied)]
+            for j in before:
+                if value[j]: continue
+                if lost:
+                    value[j] = (plies + 1) << 1
+                    following.append(j)
+                else:
+                    count[j] -= 1
+                    if not count[j]:
+                        value[j] = (plies + 1) << 1 | 1
+                        following.append(j)
+        ply, following = following, []
+        plies += 1
+    return value
+
+
+def write(path, piece, value=None):
+    """
+    solve (unless value is given) and save the table for piece at path
+    """
+    if value is None: value = build(piece)
+    longest = max(value) >> 1
+    width = max(value).bit_length()
+    if longest > 255: raise ValueError("a win in %d plies doesn't fit the header" % longest)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, piece.encode(), width, longest))
+        # eight entries make a whole number of bytes, SIZE is a multiple of 8
+        for i in range(0, SIZE, 8):
+            packed = 0
+            for entry in reversed(value[i:i + 8]):
+                packed = packed << width | entry
+            f.write(packed.to_bytes(width, 'little'))
+        f.write(bytes(2))  # spare, a probe always reads three bytes
+
+
+class Tablebase:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, piece, self.width, self.longest = HEADER.unpack_from(self.map)
+        if magic != MAGIC: raise ValueError("%s isn't a tablebase" % path)
+        self.piece = piece.rstrip(b'\0').decode()
+        self.mask = (1 << self.width) - 1
+
+    def __getitem__(self, i):
+        # the raw entry at index(...)
+        bit = i * self.width
+        start = HEADER.size + (bit >> 3)
+        return int.from_bytes(self.map[start:start + 3], 'little') >> (bit & 7) & self.mask
+
+    def close(self):
+        self.map.close()
+
+    def probe(self, game):
+        """
+        :return: Probe(WIN, DRAW or LOSS for the side to move, plies until
+        a king is knocked out), None if game isn't this table's ending
+        """
+        for strong in (0, 1):
+            pieces, other = game.pieces[strong], game.pieces[1 - strong]
+            if len(pieces) == 2 and len(other) == 1 and 'king' in other and \
+                    pieces.get(self.piece, 0).bit_count() == 1 and pieces.get('king', 0).bit_count() == 1:
+                break
+        else: return None
+        entry = self[index(_square(pieces['king']), _square(pieces[self.piece]), _square(other['king']),
+                           0 if game.turn == strong else 1)]
+        if not entry: return Probe(DRAW, 0)
+        return Probe(LOSS if entry & 1 else WIN, entry >> 1)
+
+
+def _square(mask):
+    return mask.bit_length() - 1
+
+
+def open_all(directory):
+    """
+    :return: a Tablebase for every FILES entry found in directory
+    """
+    return [Tablebase(os.path.join(directory, name)) for name in FILES.values()
+            if os.path.exists(os.path.join(directory, name))]
+
+
+def probe(tables, game):
+    # the first table that knows the position
+    for table in tables:
+        found = table.probe(game)
+        if found: return found
+    return None
+
+
+def best_move(tables, game):
+    """
+    the quickest win, any move that holds a draw, or the longest defence
+    :return: (packed move, Probe for the side to move), None when no table
+    knows the position
+    """
+    here = probe(tables, game)
+    if here is None: return None
+    best, rank = None, None
+    for move in game.packed_moves():
+        captured = game.make_move(move)
+        try:
+            if captured and captured[1] == 'king': return move, Probe(WIN, 1)
+            after = probe(tables, game)
+            if after is None:
+                # a knockout down to two bare kings: lost if they stand side
+                # by side, since it's the other king's turn
+                king, other = game.pieces[game.turn]['king'], game.pieces[1 - game.turn]['king']
+                after = Probe(WIN, 1) if KING[_square(king)] & other else Probe(DRAW, 0)
+        finally:
+            game.unmake_move()
+        # the opponent's result, turned round: best is a quick loss for
+        # them, then a draw, then a slow win for them
+        r = (-after.result, -after.plies if after.result == LOSS else after.plies)
+        if rank is None or r > rank: best, rank = move, r
+    return best, here
+
+
+def main(directory):
+    os.makedirs(directory, exist_ok=True)
+    for piece, name in FILES.items():
+        path = os.path.join(directory, name)
+        write(path, piece)
+        table = Tablebase(path)
+        print("%s: %d bits per entry, longest win %d plies, %d bytes"
+              % (name, table.width, table.longest, os.path.getsize(path)))
+        table.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'tables')
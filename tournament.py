@@ -0,0 +1,151 @@
+"""
+self-play tournaments: many headless games of Chess spread over a process
+pool, two engines per match, all results merged in one place
+
+nothing here touches Chess.score; every game returns its own record and
+merge() adds them up in game order, so the totals come out the same
+whatever order the workers finish in
+
+    python tournament.py --games 1000 --a random --b alphabeta --time 0.05
+"""
+import argparse
+import multiprocessing
+import time
+
+from chess import Chess
+from engine import Engine, RandomEngine
+from gamelog import GameLog
+from mcts import MCTS
+from moves import pack
+from run import player_A, player_B
+
+
+def make_engine(name, options, seed):
+    """
+    :param name: 'random', 'alphabeta' or 'mcts'
+    :param options: keyword arguments for Engine, mcts only takes the
+    time limit
+    :param seed: per game and side, keeps random players reproducible
+    """
+    if name == 'random': return RandomEngine(seed)
+    elif name == 'alphabeta': return Engine(**options)
+    elif name == 'mcts': return MCTS(time_limit=options['time_limit'], seed=seed)
+    raise ValueError("unknown engine %r" % name)
+
+
+def play_game(task):
+    """
+    one game from the run.py starting position, runs inside a worker
+    :param task: (index, (spec, spec), max_plies, swap), a spec being the
+    (name, options) pair for make_engine. with swap the two engines trade
+    sides on every odd game
+    :return: the game's record
+    """
+    index, specs, max_plies, swap = task
+    order = (1, 0) if swap and index % 2 else (0, 1)  # engine playing A, engine playing B
+    players = [make_engine(*specs[e], seed=2 * index + side) for side, e in enumerate(order)]
+    game = Chess({k: list(v) for k, v in player_A.items()},
+                 {k: list(v) for k, v in player_B.items()}, interactive=False)
+    seen = {game.key: 1}
+    captures = 0
+    reason = None
+    t = time.perf_counter()
+    while True:
+        result = game.result()
+        if result == 'draw': reason = 'stuck'
+        elif result: reason = 'king'
+        elif len(game.history) >= max_plies: result, reason = 'draw', 'max plies'
+        if result: break
+        if game.make_move(players[game.turn](game)): captures += 1
+        seen[game.key] = seen.get(game.key, 0) + 1
+        if seen[game.key] >= 3:
+            result, reason = 'draw', 'repetition'
+            break
+    winner = None if result == 'draw' else order[Chess.names.index(result)]
+    return {
+        'game': index,
+        'engines': order,
+        'result': result,
+        'winner': winner,
+        'reason': reason,
+        'plies': len(game.history),
+        'captures': captures,
+        'seconds': time.perf_counter() - t,
+        'moves': [pack(h[0]) if isinstance(h[0], tuple) else h[0] for h in game.history],
+    }
+
+
+def merge(records):
+    """
+    :return: totals per engine and per side plus the records themselves,
+    sorted by game index
+    """
+    records = sorted(records, key=lambda r: r['game'])
+    summary = {
+        'games': len(records),
+        'wins': [0, 0],  # per engine
+        'losses': [0, 0],
+        'draws': 0,
+        'sides': {Chess.names[0]: 0, Chess.names[1]: 0, 'draw': 0},  # per side
+        'reasons': {},
+        'plies': sum(r['plies'] for r in records),
+        'seconds': sum(r['seconds'] for r in records),
+        'records': records,
+    }
+    for r in records:
+        summary['sides'][r['result']] += 1
+        summary['reasons'][r['reason']] = summary['reasons'].get(r['reason'], 0) + 1
+        if r['winner'] is None: summary['draws'] += 1
+        else:
+            summary['wins'][r['winner']] += 1
+            summary['losses'][1 - r['winner']] += 1
+    return summary
+
+
+def tournament(games, specs, workers=None, max_plies=300, swap=True, chunksize=8, log=None):
+    """
+    :param games: number of games to play
+    :param specs: ((name, options), (name, options)) for the two engines
+    :param workers: pool size, every core by default
+    :param log: path of a gamelog.py store to append every game to, in
+    game order
+    :return: merge() of all the games
+    """
+    tasks = [(i, specs, max_plies, swap) for i in range(games)]
+    with multiprocessing.Pool(workers) as pool:
+        records = list(pool.imap_unordered(play_game, tasks, chunksize))
+    summary = merge(records)
+    if log:
+        with GameLog(log) as store:
+            for r in summary['records']:
+                store.append(r['moves'], r['result'])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--a', default='random', help="first engine, random, alphabeta or mcts")
+    parser.add_argument('--b', default='alphabeta', help="second engine")
+    parser.add_argument('--time', type=float, default=0.05, help="seconds per move for alphabeta and mcts")
+    parser.add_argument('--depth', type=int, default=64, help="max depth for alphabeta")
+    parser.add_argument('--max-plies', type=int, default=300)
+    parser.add_argument('--no-swap', action='store_true', help="keep engine a on player A throughout")
+    parser.add_argument('--log', help="append the games to this binary game log")
+    parser.add_argument('--tablebases', help="directory of tablebase.py files for alphabeta")
+    args = parser.parse_args()
+    options = {'time_limit': args.time, 'max_depth': args.depth, 'tablebases': args.tablebases}
+    summary = tournament(args.games, ((args.a, options), (args.b, options)), args.workers,
+                         args.max_plies, not args.no_swap, log=args.log)
+    print("%d games, %d plies in %.1fs of play"
+          % (summary['games'], summary['plies'], summary['seconds']))
+    print("%s: %d wins, %d losses" % (args.a, summary['wins'][0], summary['losses'][0]))
+    print("%s: %d wins, %d losses" % (args.b, summary['wins'][1], summary['losses'][1]))
+    print("draws: %d" % summary['draws'])
+    print("by side: %s" % summary['sides'])
+    print("endings: %s" % summary['reasons'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+a fixed-size transposition table: what the search found out about a
+position, keyed by its zobrist key, so reaching it again through another
+move order is a lookup instead of a second search
+
+the table is one preallocated buffer of uint64 words cut into buckets of
+two entries, nothing is allocated after it's set up, so its size is the
+memory budget and stays that way. an entry is two words
+
+    key ^ data
+    data        bits 0-15 best move (moves.py packing, 0 for none)
+                bits 16-23 depth searched
+                bits 24-25 bound, EXACT, LOWER or UPPER
+                bits 32-63 score + 2**31
+
+the first entry of a bucket keeps the deepest search that landed there,
+the second whatever came last. storing the key xored with its data means
+an entry half written by another process just doesn't match, which is
+what lets the table sit in shared memory with no lock
+
+    table = TranspositionTable(mb=64)
+    Engine(time_limit=1, table=table)
+"""
+EXACT, LOWER, UPPER = 1, 2, 3
+ENTRY = 16  # bytes: two uint64 words
+BUCKET = 2 * ENTRY
+SAMPLE = 4096  # buckets looked at for the fill rate
+
+
+def buckets(mb: float) -> int:
+    """
+    :return: how many buckets fit in mb megabytes, rounded down to a power
+    of two so a key finds its bucket with a mask
+    """
+    n = int(mb * 2 ** 20) // BUCKET
+    if n < 1: raise ValueError("%s MB is less than one bucket" % mb)
+    return 1 << n.bit_length() - 1
+
+
+class TranspositionTable:
+    def __init__(self, mb: float = 16, buffer=None):
+        """
+        :param mb: memory budget in megabytes, the table takes the largest
+        power of two number of buckets that fits
+        :param buffer: writable buffer to keep the entries in instead of a
+        fresh bytearray, a shared_memory block's buf for instance; it's
+        used as is and has to come zeroed or hold an earlier table
+        """
+        if buffer is None: buffer = bytearray(buckets(mb) * BUCKET)
+        self.buffer = buffer
+        self.words = memoryview(buffer).cast('Q')
+        count = len(self.words) // 4
+        if not count: raise ValueError("buffer is less than one bucket")
+        self.mask = (1 << count.bit_length() - 1) - 1
+        self.probes = self.hits = self.stores = 0
+
+    def __len__(self):
+        # entries, two per bucket
+        return 2 * (self.mask + 1)
+
+    def probe(self, key):
+        """
+        :return: (move, depth, bound, score) stored for key, or None
+        """
+        self.probes += 1
+        words = self.words
+        i = (key & self.mask) << 2
+        for j in (i, i + 2):
+            data = words[j + 1]
+            if data and words[j] ^ data == key:
+                self.hits += 1
+                return data & 0xFFFF, data >> 16 & 0xFF, data >> 24 & 3, (data >> 32) - 2 ** 31
+        return None
+
+    def store(self, key, move, depth, bound, score):
+        """
+        :param move: packed best move, 0 when there's none to give; an
+        earlier move for the same key is kept then
+        :param depth: plies searched below the position, 0 to 255
+        """
+        self.stores += 1
+        words = self.words
+        i = (key & self.mask) << 2
+        old = words[i + 1]
+        if not old or words[i] ^ old == key or depth >= old >> 16 & 0xFF: j = i
+        else: j = i + 2
+        if not move:
+            old = words[j + 1]
+            if old and words[j] ^ old == key: move = old & 0xFFFF
+        data = move | depth << 16 | bound << 24 | score + 2 ** 31 << 32
+        words[j + 1] = data
+        words[j] = key ^ data
+
+    def close(self):
+        # let go of the buffer, a shared_memory block can't close while
+        # it's still viewed
+        self.words.release()
+
+    def clear(self):
+        self.words.cast('B')[:] = bytes(len(self.words) * 8)
+        self.probes = self.hits = self.stores = 0
+
+    def fill_rate(self):
+        # share of entries in use, estimated from buckets spread over the
+        # whole table
+        count = self.mask + 1
+        step = max(1, count // SAMPLE)
+        sampled = range(0, count, step)
+        used = sum(bool(self.words[(b << 2) + 1]) + bool(self.words[(b << 2) + 3]) for b in sampled)
+        return used / (2 * len(sampled))
+
+    def stats(self):
+        return {
+            'entries': len(self),
+            'bytes': (self.mask + 1) * BUCKET,
+            'probes': self.probes,
+            'hits': self.hits,
+            'stores': self.stores,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'fill_rate': self.fill_rate(),
+        }
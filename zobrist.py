@@ -0,0 +1,27 @@
+"""
+zobrist keys: one random 64-bit number per (side, piece, square) plus one
+for player B to move. a position's key is the xor of the numbers for
+everything on the board, so moving a piece is two xors instead of hashing
+both dicts again
+"""
+import random
+
+from bitboard import INDEX, PIECES
+
+# fixed seed, keys have to agree across processes and runs
+_random = random.Random(0x5EED)
+KEYS = tuple({key: tuple(_random.getrandbits(64) for _ in range(64)) for key in PIECES}
+             for _ in range(2))
+TURN = _random.getrandbits(64)
+
+
+def compute(a: dict, b: dict, turn: int = 0) -> int:
+    """
+    key from scratch, Chess only does this once when it's set up
+    """
+    key = TURN if turn else 0
+    for side, player in enumerate((a, b)):
+        for piece, pcs in player.items():
+            for pc in pcs:
+                key ^= KEYS[side][piece][INDEX[pc]]
+    return key